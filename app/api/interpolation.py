@@ -1,8 +1,9 @@
+from functools import partial
 from fastapi import APIRouter, Response, status
 import models.interpolation as InterpolationModels
 import services.interpolation as InterpolationService
 from models.response import ResponseModel
-from models.interpolation import Interpolation
+from services.workers import run, run_methods
 
 router = APIRouter()
 
@@ -11,7 +12,8 @@ router = APIRouter()
 def vandermonde(input_data: InterpolationModels.Interpolation,
                 response: Response):
     try:
-        v_matrix, b, polynomial, error = InterpolationService.Vandermonde(
+        (v_matrix, b, polynomial, error), _ = run(
+            InterpolationService.Vandermonde,
             input_data.x, input_data.y
         )
         if error:
@@ -30,7 +32,8 @@ def vandermonde(input_data: InterpolationModels.Interpolation,
 @router.post("/newton")
 def newton(input_data: InterpolationModels.Interpolation, response: Response):
     try:
-        table, polynomial, error = InterpolationService.Newton(
+        (table, polynomial, error), _ = run(
+            InterpolationService.Newton,
             input_data.x, input_data.y
         )
         if error:
@@ -50,7 +53,8 @@ def newton(input_data: InterpolationModels.Interpolation, response: Response):
 def lagrange(input_data: InterpolationModels.Interpolation,
              response: Response):
     try:
-        polynomial, texPolynomial, error = InterpolationService.Lagrange(
+        (polynomial, texPolynomial, error), _ = run(
+            InterpolationService.Lagrange,
             input_data.x, input_data.y
         )
         if error:
@@ -69,7 +73,8 @@ def lagrange(input_data: InterpolationModels.Interpolation,
 def linear_spline(input_data: InterpolationModels.Interpolation,
                   response: Response):
     try:
-        matrix, tracers, error = InterpolationService.LinearSpline(
+        (matrix, tracers, error), _ = run(
+            InterpolationService.LinearSpline,
             input_data.x, input_data.y
         )
         if error:
@@ -88,7 +93,8 @@ def linear_spline(input_data: InterpolationModels.Interpolation,
 def cubic_spline(input_data: InterpolationModels.Interpolation,
                  response: Response):
     try:
-        matrix, tracers, error = InterpolationService.CubicSpline(
+        (matrix, tracers, error), _ = run(
+            InterpolationService.CubicSpline,
             input_data.x, input_data.y
         )
         if error:
@@ -103,68 +109,75 @@ def cubic_spline(input_data: InterpolationModels.Interpolation,
         return ResponseModel(None, False, "Invalid input")
 
 @router.post("/compare_all")
-def compare_all(input_data: Interpolation, response: Response):
+def compare_all(input_data: InterpolationModels.CompareAll,
+                response: Response):
     results = []
 
     methods = [
-        ("vandermonde", lambda: InterpolationService.Vandermonde(input_data.x, input_data.y)),
-        ("newton", lambda: InterpolationService.Newton(input_data.x, input_data.y)),
-        ("lagrange", lambda: InterpolationService.Lagrange(input_data.x, input_data.y)),
-        ("linear_spline", lambda: InterpolationService.LinearSpline(input_data.x, input_data.y)),
-        ("cubic_spline", lambda: InterpolationService.CubicSpline(input_data.x, input_data.y)),
+        ("vandermonde", partial(InterpolationService.Vandermonde, input_data.x, input_data.y)),
+        ("newton", partial(InterpolationService.Newton, input_data.x, input_data.y)),
+        ("lagrange", partial(InterpolationService.Lagrange, input_data.x, input_data.y)),
+        ("linear_spline", partial(InterpolationService.LinearSpline, input_data.x, input_data.y)),
+        ("cubic_spline", partial(InterpolationService.CubicSpline, input_data.x, input_data.y)),
     ]
 
-    for name, method in methods:
-        try:
-            result = method()
-            success = result[-1] is None
-            output = {
-                "method": name,
-                "success": success,
-                "error_msg": result[-1] if not success else None
-            }
-
-            if name == "vandermonde":
-                output.update({
-                    "matrix": result[0],
-                    "b": result[1],
-                    "polynomial": result[2]
-                })
-            elif name == "newton":
-                output.update({
-                    "table": result[0],
-                    "polynomial": result[1]
-                })
-            elif name == "lagrange":
-                output.update({
-                    "polynomial": result[0],
-                    "tex_polynomial": result[1]
-                })
-            elif name == "linear_spline":
-                output.update({
-                    "matrix": result[0],
-                    "tracers": result[1]
-                })
-            elif name == "cubic_spline":
-                output.update({
-                    "matrix": result[0],
-                    "tracers": result[1]
-                })
-
-            results.append(output)
-
-        except Exception as e:
+    outcomes = run_methods(methods, input_data.timeout)
+    for outcome in outcomes:
+        name = outcome["method"]
+        if outcome["exception"] is not None:
             results.append({
                 "method": name,
                 "success": False,
-                "error_msg": str(e)
+                "timed_out": outcome["timed_out"],
+                "time": outcome["time"],
+                "error_msg": str(outcome["exception"])
+            })
+            continue
+        result = outcome["result"]
+        success = result[-1] is None
+        output = {
+            "method": name,
+            "success": success,
+            "timed_out": False,
+            "time": outcome["time"],
+            "error_msg": result[-1] if not success else None
+        }
+
+        if name == "vandermonde":
+            output.update({
+                "matrix": result[0],
+                "b": result[1],
+                "polynomial": result[2]
             })
+        elif name == "newton":
+            output.update({
+                "table": result[0],
+                "polynomial": result[1]
+            })
+        elif name == "lagrange":
+            output.update({
+                "polynomial": result[0],
+                "tex_polynomial": result[1]
+            })
+        elif name == "linear_spline":
+            output.update({
+                "matrix": result[0],
+                "tracers": result[1]
+            })
+        elif name == "cubic_spline":
+            output.update({
+                "matrix": result[0],
+                "tracers": result[1]
+            })
+
+        results.append(output)
 
     successful = [r for r in results if r["success"]]
 
     best = None
     if successful:
-        best = min(successful, key=lambda r: len(r.get("matrix", r.get("polynomial", ""))))
+        best = min(successful, key=lambda r: (
+            len(r.get("matrix", r.get("polynomial", ""))), r["time"]))
 
     # Aquí está el cambio: retornamos como el frontend espera
     return {
@@ -1,154 +1,432 @@
-from fastapi import APIRouter, Response, status
+from functools import partial
+from fastapi import APIRouter, Depends, Response, status
 import models.nonlinear as NonlinearModels
 import services.nonlinear as NonlinearService
-from models.response import ResponseModel
+import services.batch as BatchService
+import services.roots as RootsService
+import services.sweep as SweepService
+import services.polynomial as PolynomialService
+from models.response import ResponseModel, StreamModel, StreamMode
+import services.workers as WorkersService
+from services.workers import Slot, admit, run, run_methods, run_stream
 
 router = APIRouter()
 
 
-def resolve_response(result, table, error, response: Response):
+def resolve_response(result, table, error, response: Response,
+                     metrics=None):
     if error:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return ResponseModel(None, False, error)
 
     data = {"root": result}
+    if metrics is not None:
+        data["metrics"] = metrics
 
     if table is None:
         return ResponseModel(data, True, None)
 
     data["columns"] = table["columns"]
     data["rows"] = table["rows"]
+    for key in ("evaluations", "escalated"):
+        if key in table:
+            data[key] = table[key]
 
     return ResponseModel(data, True, None)
 
 
 @router.post("/bisection")
-def bisection(input_data: NonlinearModels.Bisection, response: Response):
-    try:
-        result, table, error = NonlinearService.Bisection(
+def bisection(input_data: NonlinearModels.Bisection, response: Response,
+              stream: StreamMode = None,
+              slot: Slot = Depends(admit)):
+    if stream:
+        steps = run_stream(
+            NonlinearService.bisection_steps,
             input_data.a, input_data.b, input_data.fx,
             input_data.tol, input_data.niter, input_data.relativeError
         )
+        return StreamModel(steps, NonlinearService.bracketColumns, stream,
+                           slot)
+    try:
+        (result, table, error), metrics = run(
+            NonlinearService.Bisection,
+            input_data.a, input_data.b, input_data.fx,
+            input_data.tol, input_data.niter, input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK
+        )
     except Exception:
         return ResponseModel(None, False, "Invalid input")
-    return resolve_response(result, table, error, response)
+    return resolve_response(result, table, error, response, metrics)
 
 
 @router.post("/fixed_point")
-def fixed_point(input_data: NonlinearModels.FixedPoint, response: Response):
+def fixed_point(input_data: NonlinearModels.FixedPoint, response: Response,
+                stream: StreamMode = None,
+                slot: Slot = Depends(admit)):
+    if stream:
+        steps = run_stream(
+            NonlinearService.fixed_point_steps,
+            input_data.x0, input_data.fx, input_data.gx,
+            input_data.tol, input_data.niter, input_data.relativeError,
+            input_data.acceleration
+        )
+        columns = NonlinearService.fixed_point_columns(
+            input_data.acceleration)
+        return StreamModel(steps, columns, stream, slot)
     try:
-        result, table, error = NonlinearService.Fixed_point(
+        (result, table, error), metrics = run(
+            NonlinearService.Fixed_point,
             input_data.x0, input_data.fx, input_data.gx,
-            input_data.tol, input_data.niter, input_data.relativeError
+            input_data.tol, input_data.niter, input_data.relativeError,
+            input_data.acceleration,
+            history=input_data.history,
+            historyK=input_data.historyK
         )
     except Exception:
         return ResponseModel(None, False, "Invalid input")
-    return resolve_response(result, table, error, response)
+    return resolve_response(result, table, error, response, metrics)
 
 
 @router.post("/false_position")
-def false_position(input_data: NonlinearModels.FalsePosition, response: Response):
+def false_position(input_data: NonlinearModels.FalsePosition, response: Response,
+                   stream: StreamMode = None,
+                   slot: Slot = Depends(admit)):
+    if stream:
+        steps = run_stream(
+            NonlinearService.false_position_steps,
+            input_data.a, input_data.b, input_data.fx,
+            input_data.tol, input_data.niter, input_data.relativeError
+        )
+        return StreamModel(steps, NonlinearService.bracketColumns, stream,
+                           slot)
     try:
-        result, table, error = NonlinearService.False_position(
+        (result, table, error), metrics = run(
+            NonlinearService.False_position,
+            input_data.a, input_data.b, input_data.fx,
+            input_data.tol, input_data.niter, input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK
+        )
+    except Exception:
+        return ResponseModel(None, False, "Invalid input")
+    return resolve_response(result, table, error, response, metrics)
+
+
+@router.post("/brent")
+def brent(input_data: NonlinearModels.Brent, response: Response,
+          stream: StreamMode = None,
+          slot: Slot = Depends(admit)):
+    if stream:
+        steps = run_stream(
+            NonlinearService.brent_steps,
             input_data.a, input_data.b, input_data.fx,
             input_data.tol, input_data.niter, input_data.relativeError
         )
+        return StreamModel(steps, NonlinearService.bracketColumns, stream,
+                           slot)
+    try:
+        (result, table, error), metrics = run(
+            NonlinearService.Brent,
+            input_data.a, input_data.b, input_data.fx,
+            input_data.tol, input_data.niter, input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK
+        )
     except Exception:
         return ResponseModel(None, False, "Invalid input")
-    return resolve_response(result, table, error, response)
+    return resolve_response(result, table, error, response, metrics)
 
 
-@router.post("/newton")
-def newton(input_data: NonlinearModels.Newton, response: Response):
+@router.post("/illinois")
+def illinois(input_data: NonlinearModels.Illinois, response: Response,
+             stream: StreamMode = None,
+             slot: Slot = Depends(admit)):
+    if stream:
+        steps = run_stream(
+            NonlinearService.illinois_steps,
+            input_data.a, input_data.b, input_data.fx,
+            input_data.tol, input_data.niter, input_data.relativeError,
+            input_data.andersonBjorck
+        )
+        return StreamModel(steps, NonlinearService.bracketColumns, stream,
+                           slot)
     try:
-        result, table, error = NonlinearService.Newton(
+        (result, table, error), metrics = run(
+            NonlinearService.Illinois,
+            input_data.a, input_data.b, input_data.fx,
+            input_data.tol, input_data.niter, input_data.relativeError,
+            input_data.andersonBjorck,
+            history=input_data.history,
+            historyK=input_data.historyK
+        )
+    except Exception:
+        return ResponseModel(None, False, "Invalid input")
+    return resolve_response(result, table, error, response, metrics)
+
+
+@router.post("/newton")
+def newton(input_data: NonlinearModels.Newton, response: Response,
+           stream: StreamMode = None,
+           slot: Slot = Depends(admit)):
+    if stream:
+        steps = run_stream(
+            NonlinearService.newton_steps,
             input_data.x0, input_data.fx, input_data.tol,
             input_data.niter, False, input_data.relativeError
         )
+        return StreamModel(steps, NonlinearService.openColumns, stream, slot)
+    try:
+        (result, table, error), metrics = run(
+            NonlinearService.Newton,
+            input_data.x0, input_data.fx, input_data.tol,
+            input_data.niter, False, input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK
+        )
     except Exception:
         return ResponseModel(None, False, "Invalid input")
-    return resolve_response(result, table, error, response)
+    return resolve_response(result, table, error, response, metrics)
 
 
 @router.post("/secant")
-def secant(input_data: NonlinearModels.Secant, response: Response):
-    try:
-        result, table, error = NonlinearService.Secant(
+def secant(input_data: NonlinearModels.Secant, response: Response,
+           stream: StreamMode = None,
+           slot: Slot = Depends(admit)):
+    if stream:
+        steps = run_stream(
+            NonlinearService.secant_steps,
             input_data.x0, input_data.x1, input_data.fx,
             input_data.tol, input_data.niter, input_data.relativeError
         )
+        return StreamModel(steps, NonlinearService.openColumns, stream, slot)
+    try:
+        (result, table, error), metrics = run(
+            NonlinearService.Secant,
+            input_data.x0, input_data.x1, input_data.fx,
+            input_data.tol, input_data.niter, input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK
+        )
     except Exception:
         return ResponseModel(None, False, "Invalid input")
-    return resolve_response(result, table, error, response)
+    return resolve_response(result, table, error, response, metrics)
 
 
 @router.post("/multiple_roots")
-def multiple_roots(input_data: NonlinearModels.Newton, response: Response):
-    try:
-        result, table, error = NonlinearService.Newton(
+def multiple_roots(input_data: NonlinearModels.Newton, response: Response,
+                   stream: StreamMode = None,
+                   slot: Slot = Depends(admit)):
+    if stream:
+        steps = run_stream(
+            NonlinearService.newton_steps,
             input_data.x0, input_data.fx, input_data.tol,
             input_data.niter, True, input_data.relativeError
         )
+        return StreamModel(steps, NonlinearService.openColumns, stream, slot)
+    try:
+        (result, table, error), metrics = run(
+            NonlinearService.Newton,
+            input_data.x0, input_data.fx, input_data.tol,
+            input_data.niter, True, input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK
+        )
+    except Exception:
+        return ResponseModel(None, False, "Invalid input")
+    return resolve_response(result, table, error, response, metrics)
+
+
+@router.post("/batch")
+def batch(input_data: NonlinearModels.Batch, response: Response):
+    try:
+        (data, error), metrics = run(
+            BatchService.Batch,
+            input_data.method, input_data.fx,
+            input_data.a, input_data.b, input_data.x0, input_data.x1,
+            input_data.tol, input_data.niter, input_data.relativeError,
+            input_data.tables
+        )
+    except Exception:
+        return ResponseModel(None, False, "Invalid input")
+    if error:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return ResponseModel(None, False, error)
+    data["metrics"] = metrics
+    return ResponseModel(data, True, None)
+
+
+@router.post("/all_roots")
+def all_roots(input_data: NonlinearModels.AllRoots, response: Response):
+    try:
+        (data, error), metrics = run(
+            RootsService.All_roots,
+            input_data.a, input_data.b, input_data.fx,
+            input_data.tol, input_data.niter,
+            input_data.points, input_data.depth
+        )
+    except Exception:
+        return ResponseModel(None, False, "Invalid input")
+    if error:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return ResponseModel(None, False, error)
+    data["metrics"] = metrics
+    return ResponseModel(data, True, None)
+
+
+@router.post("/sweep")
+def sweep(input_data: NonlinearModels.Sweep, response: Response):
+    try:
+        (data, error), metrics = run(
+            SweepService.Sweep,
+            input_data.fx, input_data.p, input_data.x0,
+            input_data.tol, input_data.niter, input_data.relativeError,
+            input_data.chunks
+        )
     except Exception:
         return ResponseModel(None, False, "Invalid input")
-    return resolve_response(result, table, error, response)
+    if error:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return ResponseModel(None, False, error)
+    data["metrics"] = metrics
+    return ResponseModel(data, True, None)
+
+
+@router.post("/poly_roots")
+def poly_roots(input_data: NonlinearModels.PolyRoots, response: Response):
+    try:
+        (data, error), metrics = run(
+            PolynomialService.Poly_roots,
+            input_data.fx, input_data.polish,
+            input_data.tol, input_data.niter
+        )
+    except Exception:
+        return ResponseModel(None, False, "Invalid input")
+    if error:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return ResponseModel(None, False, error)
+    data["metrics"] = metrics
+    return ResponseModel(data, True, None)
+
+
+# Parse caches of the worker processes, added up
+@router.get("/cache")
+def cache():
+    return ResponseModel(WorkersService.cache_info(), True, None)
 
 @router.post("/compare_all")
 def compare_all(input_data: NonlinearModels.CompareAll, response: Response):
     results = []
     methods = [
-        ("bisection", lambda: NonlinearService.Bisection(
+        ("bisection", partial(
+            NonlinearService.Bisection,
             input_data.a, input_data.b, input_data.fx,
-            input_data.tol, input_data.niter, input_data.relativeError
+            input_data.tol, input_data.niter, input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK
         )),
-        ("false_position", lambda: NonlinearService.False_position(
+        ("false_position", partial(
+            NonlinearService.False_position,
             input_data.a, input_data.b, input_data.fx,
-            input_data.tol, input_data.niter, input_data.relativeError
+            input_data.tol, input_data.niter, input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK
+        )),
+        ("brent", partial(
+            NonlinearService.Brent,
+            input_data.a, input_data.b, input_data.fx,
+            input_data.tol, input_data.niter, input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK
+        )),
+        ("illinois", partial(
+            NonlinearService.Illinois,
+            input_data.a, input_data.b, input_data.fx,
+            input_data.tol, input_data.niter, input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK
         )),
-        ("fixed_point", lambda: NonlinearService.Fixed_point(
+        ("fixed_point", partial(
+            NonlinearService.Fixed_point,
             input_data.x0, input_data.fx, input_data.gx,
-            input_data.tol, input_data.niter, input_data.relativeError
+            input_data.tol, input_data.niter, input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK
         )),
-        ("newton", lambda: NonlinearService.Newton(
+        ("newton", partial(
+            NonlinearService.Newton,
             input_data.x0, input_data.fx,
             input_data.tol, input_data.niter, False,
-            input_data.relativeError
+            input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK
         )),
-        ("secant", lambda: NonlinearService.Secant(
+        ("secant", partial(
+            NonlinearService.Secant,
             input_data.x0, input_data.x1, input_data.fx,
-            input_data.tol, input_data.niter, input_data.relativeError
+            input_data.tol, input_data.niter, input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK
         )),
-        ("multiple_roots", lambda: NonlinearService.Newton(
+        ("multiple_roots", partial(
+            NonlinearService.Newton,
             input_data.x0, input_data.fx,
             input_data.tol, input_data.niter, True,
-            input_data.relativeError
+            input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK
         )),
     ]
+    if input_data.acceleration != "none":
+        # Accelerated fixed point next to the plain one, to show the saving
+        methods.append((
+            f'fixed_point_{input_data.acceleration}',
+            partial(
+                NonlinearService.Fixed_point,
+                input_data.x0, input_data.fx, input_data.gx,
+                input_data.tol, input_data.niter, input_data.relativeError,
+                input_data.acceleration,
+                history=input_data.history,
+                historyK=input_data.historyK
+            )))
 
-    for name, method in methods:
-        try:
-            root, table, error = method()
-            results.append({
-                "method": name,
-                "success": error is None,
-                "root": root,
-                "iterations": len(table["rows"]) - 1 if table else None,
-                "final_error": table["rows"][-1][-1] if table else None,
-                "rows": table["rows"] if table else [],
-                "columns": table["columns"] if table else [],
-                "error_msg": error
-            })
-        except Exception as e:
+    outcomes = run_methods(methods, input_data.timeout,
+                           input_data.maxEvaluations)
+    for outcome in outcomes:
+        name = outcome["method"]
+        if outcome["exception"] is not None:
             results.append({
                 "method": name,
                 "success": False,
-                "error_msg": str(e)
+                "timed_out": outcome["timed_out"],
+                "time": outcome["time"],
+                "evaluations": outcome["evaluations"],
+                "metrics": outcome["metrics"],
+                "error_msg": str(outcome["exception"])
             })
+            continue
+        root, table, error = outcome["result"]
+        results.append({
+            "method": name,
+            "success": error is None,
+            "root": root,
+            "iterations": table["rows"][-1][0] if table else 0,
+            "final_error": table["rows"][-1][-1] if table else 0,
+            "rows": table["rows"] if table else [],
+            "columns": table["columns"] if table else [],
+            "timed_out": False,
+            "time": outcome["time"],
+            "evaluations": outcome["evaluations"],
+            "metrics": outcome["metrics"],
+            "error_msg": error
+        })
 
     successful = [r for r in results if r["success"]]
     best = None
     if successful:
-        best = min(successful, key=lambda r: (r["iterations"], r["final_error"]))
+        best = min(successful, key=lambda r: (
+            r["iterations"], r["evaluations"], r["time"],
+            r["final_error"]))
 
     return {
         "success": True,
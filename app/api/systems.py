@@ -1,101 +1,345 @@
-from fastapi import APIRouter, Response, status
+from functools import partial
+from typing import Literal
+from fastapi import APIRouter, Depends, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 import models.systems as SystemsModels
 import services.systems as SystemsService
-from models.response import ResponseModel
+import services.direct as DirectService
+import services.krylov as KrylovService
+import services.ingest as IngestService
+from models.response import ResponseModel, StreamModel, StreamMode
+from services.workers import Slot, admit, run, run_methods, run_stream
 
 router = APIRouter()
 
-def resolve_response(data, error, response: Response):
+# Sparse and stored matrices reach the services as plain dicts
+def matrix(A):
+    if isinstance(A, (SystemsModels.SparseMatrix,
+                      SystemsModels.StoredMatrix)):
+        return A.model_dump()
+    return A
+
+def resolve_response(data, error, response: Response, metrics=None):
     if error:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return ResponseModel(None, False, error)
 
+    if data is not None and metrics is not None:
+        data["metrics"] = metrics
+
     if data is None:
         return ResponseModel(data, True, None)
 
     return ResponseModel(data, True, None)
 
 @router.post("/jacobi")
-def jacobi(input_data: SystemsModels.Jacobi, response: Response):
+def jacobi(input_data: SystemsModels.Jacobi, response: Response,
+           stream: StreamMode = None,
+           slot: Slot = Depends(admit)):
+    if stream:
+        steps = run_stream(
+            SystemsService.iterative_steps,
+            matrix(input_data.A), input_data.b, input_data.x0,
+            input_data.tol, input_data.niter, "jacobi",
+            input_data.relativeError, exact=input_data.exact,
+            matrices=input_data.matrices,
+            checkConvergence=input_data.checkConvergence,
+            B=input_data.B
+        )
+        return StreamModel(steps, SystemsService.columns, stream, slot)
     try:
-        data, error = SystemsService.Iterative_methods(
-            input_data.A, input_data.b, input_data.x0,
+        (data, error), metrics = run(
+            SystemsService.Iterative_methods,
+            matrix(input_data.A), input_data.b, input_data.x0,
             input_data.tol, input_data.niter, "jacobi",
-            input_data.relativeError
+            input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK,
+            exact=input_data.exact,
+            matrices=input_data.matrices,
+            checkConvergence=input_data.checkConvergence,
+            B=input_data.B
         )
     except Exception:
         return ResponseModel(None, False, "Invalid input")
-    return resolve_response(data, error, response)
+    return resolve_response(data, error, response, metrics)
 
 @router.post("/gauss-seidel")
-def gauss_seidel(input_data: SystemsModels.GaussSeidel, response: Response):
+def gauss_seidel(input_data: SystemsModels.GaussSeidel, response: Response,
+                 stream: StreamMode = None,
+                 slot: Slot = Depends(admit)):
+    if stream:
+        steps = run_stream(
+            SystemsService.iterative_steps,
+            matrix(input_data.A), input_data.b, input_data.x0,
+            input_data.tol, input_data.niter, "gauss",
+            input_data.relativeError, exact=input_data.exact,
+            matrices=input_data.matrices,
+            checkConvergence=input_data.checkConvergence,
+            B=input_data.B
+        )
+        return StreamModel(steps, SystemsService.columns, stream, slot)
     try:
-        data, error = SystemsService.Iterative_methods(
-            input_data.A, input_data.b, input_data.x0,
+        (data, error), metrics = run(
+            SystemsService.Iterative_methods,
+            matrix(input_data.A), input_data.b, input_data.x0,
             input_data.tol, input_data.niter, "gauss",
-            input_data.relativeError
+            input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK,
+            exact=input_data.exact,
+            matrices=input_data.matrices,
+            checkConvergence=input_data.checkConvergence,
+            B=input_data.B
         )
     except Exception:
         return ResponseModel(None, False, "Invalid input")
-    return resolve_response(data, error, response)
+    return resolve_response(data, error, response, metrics)
 
 @router.post("/sor")
-def sor(input_data: SystemsModels.SOR, response: Response):
+def sor(input_data: SystemsModels.SOR, response: Response,
+        stream: StreamMode = None,
+        slot: Slot = Depends(admit)):
+    if stream:
+        steps = run_stream(
+            SystemsService.iterative_steps,
+            matrix(input_data.A), input_data.b, input_data.x0,
+            input_data.tol, input_data.niter, "gauss",
+            input_data.relativeError, input_data.w, input_data.exact,
+            input_data.matrices, input_data.checkConvergence,
+            input_data.B
+        )
+        return StreamModel(steps, SystemsService.columns, stream, slot)
     try:
-        data, error = SystemsService.Iterative_methods(
-            input_data.A, input_data.b, input_data.x0,
+        (data, error), metrics = run(
+            SystemsService.Iterative_methods,
+            matrix(input_data.A), input_data.b, input_data.x0,
             input_data.tol, input_data.niter, "gauss",
-            input_data.relativeError, input_data.w
+            input_data.relativeError, input_data.w,
+            history=input_data.history,
+            historyK=input_data.historyK,
+            exact=input_data.exact,
+            matrices=input_data.matrices,
+            checkConvergence=input_data.checkConvergence,
+            B=input_data.B
+        )
+    except Exception:
+        return ResponseModel(None, False, "Invalid input")
+    return resolve_response(data, error, response, metrics)
+
+@router.post("/cg")
+def cg(input_data: SystemsModels.CG, response: Response,
+       stream: StreamMode = None,
+       slot: Slot = Depends(admit)):
+    if stream:
+        steps = run_stream(
+            KrylovService.krylov_steps,
+            matrix(input_data.A), input_data.b, input_data.x0,
+            input_data.tol, input_data.niter, "cg",
+            input_data.relativeError, input_data.preconditioner
+        )
+        return StreamModel(steps, KrylovService.columns, stream, slot)
+    try:
+        (data, error), metrics = run(
+            KrylovService.Krylov_methods,
+            matrix(input_data.A), input_data.b, input_data.x0,
+            input_data.tol, input_data.niter, "cg",
+            input_data.relativeError,
+            preconditioner=input_data.preconditioner,
+            history=input_data.history,
+            historyK=input_data.historyK
+        )
+    except Exception:
+        return ResponseModel(None, False, "Invalid input")
+    return resolve_response(data, error, response, metrics)
+
+@router.post("/bicgstab")
+def bicgstab(input_data: SystemsModels.BiCGSTAB, response: Response,
+             stream: StreamMode = None,
+             slot: Slot = Depends(admit)):
+    if stream:
+        steps = run_stream(
+            KrylovService.krylov_steps,
+            matrix(input_data.A), input_data.b, input_data.x0,
+            input_data.tol, input_data.niter, "bicgstab",
+            input_data.relativeError, input_data.preconditioner
+        )
+        return StreamModel(steps, KrylovService.columns, stream, slot)
+    try:
+        (data, error), metrics = run(
+            KrylovService.Krylov_methods,
+            matrix(input_data.A), input_data.b, input_data.x0,
+            input_data.tol, input_data.niter, "bicgstab",
+            input_data.relativeError,
+            preconditioner=input_data.preconditioner,
+            history=input_data.history,
+            historyK=input_data.historyK
         )
     except Exception:
         return ResponseModel(None, False, "Invalid input")
+    return resolve_response(data, error, response, metrics)
+
+@router.post("/gmres")
+def gmres(input_data: SystemsModels.GMRES, response: Response,
+          stream: StreamMode = None,
+          slot: Slot = Depends(admit)):
+    if stream:
+        steps = run_stream(
+            KrylovService.krylov_steps,
+            matrix(input_data.A), input_data.b, input_data.x0,
+            input_data.tol, input_data.niter, "gmres",
+            input_data.relativeError, input_data.preconditioner,
+            input_data.restart
+        )
+        return StreamModel(steps, KrylovService.columns, stream, slot)
+    try:
+        (data, error), metrics = run(
+            KrylovService.Krylov_methods,
+            matrix(input_data.A), input_data.b, input_data.x0,
+            input_data.tol, input_data.niter, "gmres",
+            input_data.relativeError,
+            preconditioner=input_data.preconditioner,
+            restart=input_data.restart,
+            history=input_data.history,
+            historyK=input_data.historyK
+        )
+    except Exception:
+        return ResponseModel(None, False, "Invalid input")
+    return resolve_response(data, error, response, metrics)
+
+# Upload A as a file (the raw request body) instead of JSON; the returned id
+# is then passed as A = {"format": "stored", "id": ...}
+@router.post("/matrices")
+async def upload_matrix(request: Request, response: Response,
+                        format: Literal["npy", "mtx", "raw"] = "npy"):
+    try:
+        length = request.headers.get("content-length")
+        id = await IngestService.matrix_store.receive(
+            request.stream(), int(length) if length else None)
+    except IngestService.UploadTooLarge as e:
+        response.status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        return ResponseModel(None, False, str(e))
+    try:
+        (data, error), metrics = await run_in_threadpool(
+            run, IngestService.Store, id, format)
+    except Exception:
+        return ResponseModel(None, False, "Invalid input")
+    return resolve_response(data, error, response, metrics)
+
+@router.delete("/matrices/{id}")
+def delete_matrix(id: str, response: Response):
+    data, error = IngestService.Remove(id)
     return resolve_response(data, error, response)
 
+# LU with partial pivoting or Cholesky; factorizations of repeated matrices
+# are served from a cache held by the server, which calls the pool itself
+@router.post("/direct")
+def direct(input_data: SystemsModels.Direct, response: Response):
+    try:
+        (data, error), metrics = DirectService.Direct(
+            matrix(input_data.A), input_data.b, input_data.method
+        )
+    except Exception:
+        return ResponseModel(None, False, "Invalid input")
+    return resolve_response(data, error, response, metrics)
+
 @router.post("/compare_all")
 def compare_all(input_data: SystemsModels.CompareAll, response: Response):
     results = []
     methods = [
-        ("jacobi", lambda: SystemsService.Iterative_methods(
-            input_data.A, input_data.b, input_data.x0,
+        ("jacobi", partial(
+            SystemsService.Iterative_methods,
+            matrix(input_data.A), input_data.b, input_data.x0,
             input_data.tol, input_data.niter, "jacobi",
-            input_data.relativeError
+            input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK,
+            exact=input_data.exact,
+            matrices=input_data.matrices,
+            checkConvergence=input_data.checkConvergence,
+            B=input_data.B
         )),
-        ("gauss-seidel", lambda: SystemsService.Iterative_methods(
-            input_data.A, input_data.b, input_data.x0,
+        ("gauss-seidel", partial(
+            SystemsService.Iterative_methods,
+            matrix(input_data.A), input_data.b, input_data.x0,
             input_data.tol, input_data.niter, "gauss",
-            input_data.relativeError
+            input_data.relativeError,
+            history=input_data.history,
+            historyK=input_data.historyK,
+            exact=input_data.exact,
+            matrices=input_data.matrices,
+            checkConvergence=input_data.checkConvergence,
+            B=input_data.B
         )),
-        ("sor", lambda: SystemsService.Iterative_methods(
-            input_data.A, input_data.b, input_data.x0,
+        ("sor", partial(
+            SystemsService.Iterative_methods,
+            matrix(input_data.A), input_data.b, input_data.x0,
             input_data.tol, input_data.niter, "gauss",
-            input_data.relativeError, input_data.w
+            input_data.relativeError, input_data.w,
+            history=input_data.history,
+            historyK=input_data.historyK,
+            exact=input_data.exact,
+            matrices=input_data.matrices,
+            checkConvergence=input_data.checkConvergence,
+            B=input_data.B
         ))
     ]
+    # The Krylov methods solve one right-hand side
+    if input_data.B is None:
+        methods += [
+            (name, partial(
+                KrylovService.Krylov_methods,
+                matrix(input_data.A), input_data.b, input_data.x0,
+                input_data.tol, input_data.niter, method,
+                input_data.relativeError,
+                preconditioner=input_data.preconditioner,
+                restart=input_data.restart,
+                history=input_data.history,
+                historyK=input_data.historyK
+            ))
+            for name, method in (("cg", "cg"), ("bicgstab", "bicgstab"),
+                                 ("gmres", "gmres"))
+        ]
 
-    for name, method in methods:
-        try:
-            data, error = method()
-            results.append({
-                "method": name,
-                "success": error is None,
-                "solution": data["x"] if data else None,
-                "iterations": len(data["rows"]) - 1 if data else None,
-                "final_error": data["rows"][-1][-1] if data else None,
-                "rows": data["rows"] if data else [],
-                "columns": data["columns"] if data else [],
-                "error_msg": error
-            })
-        except Exception as e:
+    outcomes = run_methods(methods, input_data.timeout,
+                           input_data.maxEvaluations)
+    for outcome in outcomes:
+        name = outcome["method"]
+        if outcome["exception"] is not None:
             results.append({
                 "method": name,
                 "success": False,
-                "error_msg": str(e)
+                "timed_out": outcome["timed_out"],
+                "time": outcome["time"],
+                "evaluations": outcome["evaluations"],
+                "metrics": outcome["metrics"],
+                "error_msg": str(outcome["exception"])
             })
+            continue
+        data, error = outcome["result"]
+        results.append({
+            "method": name,
+            "success": error is None,
+            "solution": data["x"] if data else None,
+            "iterations": data["rows"][-1][0] if data else None,
+            "final_error": data["rows"][-1][-1] if data else None,
+            "convergence": data.get("convergence") if data else None,
+            "relaxation": data.get("relaxation") if data else None,
+            "rows": data["rows"] if data else [],
+            "columns": data["columns"] if data else [],
+            "timed_out": False,
+            "time": outcome["time"],
+            "evaluations": outcome["evaluations"],
+            "metrics": outcome["metrics"],
+            "error_msg": error
+        })
 
     successful = [r for r in results if r["success"]]
     best = None
     if successful:
-        best = min(successful, key=lambda r: (r["iterations"], r["final_error"]))
+        best = min(successful, key=lambda r: (
+            r["iterations"], r["evaluations"], r["time"],
+            r["final_error"]))
 
     return {
         "success": True,
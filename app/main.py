@@ -1,9 +1,10 @@
 from decouple import config
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api.nonlinear import router as NonlinearRouter
 from api.systems import router as SystemsRouter
 from api.interpolation import router as InterpolationRouter
+import services.workers as WorkersService
 import uvicorn
 
 app = FastAPI()
@@ -16,15 +17,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(NonlinearRouter, tags=["Nonlinear"], prefix="/nonlinear")
-app.include_router(SystemsRouter, tags=["Systems"], prefix="/systems")
+# Requests beyond the capacity of the worker pool are rejected with a 503
+admission = [Depends(WorkersService.admit)]
+
+app.include_router(NonlinearRouter, tags=["Nonlinear"], prefix="/nonlinear",
+                   dependencies=admission)
+app.include_router(SystemsRouter, tags=["Systems"], prefix="/systems",
+                   dependencies=admission)
 app.include_router(InterpolationRouter, tags=[
-                   "Interpolation"], prefix="/interpolation")
+                   "Interpolation"], prefix="/interpolation",
+                   dependencies=admission)
 
 @app.get("/", tags=["Root"])
 async def read_root():
     return {"message": "Welcome to VeritasNumercis API; seeking the true numerical solution"} 
 
+
+# Queue depth and worker utilisation, for monitoring and autoscaling
+@app.get("/workers", tags=["Root"])
+async def workers():
+    return WorkersService.stats()
+
 if __name__ == "__main__":
     port = config("PORT", default=8000, cast=int)
     uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
\ No newline at end of file
@@ -2,4 +2,8 @@ from pydantic import BaseModel
 
 class Interpolation(BaseModel):
     x: list[float]
-    y: list[float]
\ No newline at end of file
+    y: list[float]
+
+
+class CompareAll(Interpolation):
+    timeout: float | None = None
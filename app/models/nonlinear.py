@@ -1,4 +1,8 @@
+from typing import Literal
 from pydantic import BaseModel
+from models.response import HistoryMode
+
+Acceleration = Literal["none", "aitken", "steffensen"]
 
 
 class Bisection(BaseModel):
@@ -8,6 +12,8 @@ class Bisection(BaseModel):
     fx: str
     niter: int
     relativeError: bool
+    history: HistoryMode = "full"
+    historyK: int = 10
 
 
 class FixedPoint(BaseModel):
@@ -17,6 +23,9 @@ class FixedPoint(BaseModel):
     tol: float
     niter: int
     relativeError: bool
+    acceleration: Acceleration = "none"
+    history: HistoryMode = "full"
+    historyK: int = 10
 
 
 class FalsePosition(BaseModel):
@@ -26,6 +35,31 @@ class FalsePosition(BaseModel):
     tol: float
     niter: int
     relativeError: bool
+    history: HistoryMode = "full"
+    historyK: int = 10
+
+
+class Brent(BaseModel):
+    a: str
+    b: str
+    fx: str
+    tol: float
+    niter: int
+    relativeError: bool
+    history: HistoryMode = "full"
+    historyK: int = 10
+
+
+class Illinois(BaseModel):
+    a: str
+    b: str
+    fx: str
+    tol: float
+    niter: int
+    relativeError: bool
+    andersonBjorck: bool = False
+    history: HistoryMode = "full"
+    historyK: int = 10
 
 
 class Newton(BaseModel):
@@ -34,6 +68,8 @@ class Newton(BaseModel):
     tol: float
     niter: int
     relativeError: bool
+    history: HistoryMode = "full"
+    historyK: int = 10
 
 
 class Secant(BaseModel):
@@ -43,6 +79,8 @@ class Secant(BaseModel):
     tol: float
     niter: int
     relativeError: bool
+    history: HistoryMode = "full"
+    historyK: int = 10
 
 class CompareAll(BaseModel):
     a: str
@@ -54,3 +92,48 @@ class CompareAll(BaseModel):
     tol: float
     niter: int
     relativeError: bool
+    timeout: float | None = None
+    maxEvaluations: int | None = None
+    acceleration: Acceleration = "none"
+    history: HistoryMode = "full"
+    historyK: int = 10
+
+
+class Batch(BaseModel):
+    method: str
+    fx: str
+    a: list[float] = []
+    b: list[float] = []
+    x0: list[float] = []
+    x1: list[float] = []
+    tol: float
+    niter: int
+    relativeError: bool
+    tables: bool = False
+
+
+class AllRoots(BaseModel):
+    a: str
+    b: str
+    fx: str
+    tol: float
+    niter: int
+    points: int = 1000
+    depth: int = 8
+
+
+class Sweep(BaseModel):
+    fx: str
+    p: list[float]
+    x0: str
+    tol: float
+    niter: int
+    relativeError: bool
+    chunks: int = 8
+
+
+class PolyRoots(BaseModel):
+    fx: str
+    polish: bool = False
+    tol: float = 1e-12
+    niter: int = 50
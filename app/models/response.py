@@ -1,3 +1,19 @@
+import json
+import math
+import numpy as np
+from typing import Literal
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+StreamMode = Literal["ndjson", "sse"] | None
+HistoryMode = Literal["full", "every_k", "last_k", "none"]
+
+mediaTypes = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
 def ResponseModel(data, success, error):
     if not success:
         return {
@@ -8,3 +24,57 @@ def ResponseModel(data, success, error):
         "success": success,
         "data": data,
     }
+
+
+# Replace non-finite floats (not valid JSON) with None
+def finite(value):
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, (list, tuple)):
+        return [finite(v) for v in value]
+    if isinstance(value, dict):
+        return {k: finite(v) for k, v in value.items()}
+    return value
+
+
+# Events of a steps generator: the columns, one row per iteration and the
+# final result or error
+def stream_events(steps, columns):
+    yield "columns", columns
+    try:
+        while True:
+            try:
+                row = next(steps)
+            except StopIteration as stop:
+                result = stop.value
+                break
+            yield "row", row
+    except Exception:
+        yield "error", "Invalid input"
+        return
+    if "error" in result:
+        yield "error", result["error"]
+    else:
+        yield "result", result
+
+
+# Streaming response of a steps generator. It takes over the admission slot
+# of the request, released when the body ends (or, if the client leaves
+# before it starts, by the background task)
+def StreamModel(steps, columns, mode, slot):
+    release = slot.detach()
+
+    def encode():
+        try:
+            for event, data in stream_events(steps, columns):
+                if mode == "sse":
+                    yield f'event: {event}\ndata: {json.dumps(finite(data))}\n\n'
+                else:
+                    yield json.dumps({"event": event, "data": finite(data)}) + "\n"
+        finally:
+            steps.close()
+            release()
+    return StreamingResponse(encode(), media_type=mediaTypes[mode],
+                             background=BackgroundTask(release))
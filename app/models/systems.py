@@ -1,35 +1,125 @@
+from typing import Literal
 from pydantic import BaseModel
+from models.response import HistoryMode
+
+# Sparse A: COO triplets (row, col, data) or CSR arrays (indptr, indices,
+# data); duplicate COO entries are summed
+class SparseMatrix(BaseModel):
+    format: Literal["coo", "csr"]
+    shape: tuple[int, int]
+    data: list[float]
+    row: list[int] = []
+    col: list[int] = []
+    indptr: list[int] = []
+    indices: list[int] = []
+
+# Matrix uploaded to /systems/matrices, referred to by the id it returned
+class StoredMatrix(BaseModel):
+    format: Literal["stored"]
+    id: str
 
 class Jacobi(BaseModel):
-    A: list
-    b: list
+    A: list | SparseMatrix | StoredMatrix
+    b: list | None = None
+    # Several right-hand sides at once, n x k (one column per system)
+    B: list | None = None
     x0: list
     tol: float
     niter: int
     relativeError: bool
+    history: HistoryMode = "full"
+    historyK: int = 10
+    exact: bool = False
+    matrices: bool = False
+    checkConvergence: bool = True
 
 class GaussSeidel(BaseModel):
-    A: list
-    b: list
+    A: list | SparseMatrix | StoredMatrix
+    b: list | None = None
+    B: list | None = None
     x0: list
     tol: float
     niter: int
     relativeError: bool
+    history: HistoryMode = "full"
+    historyK: int = 10
+    exact: bool = False
+    matrices: bool = False
+    checkConvergence: bool = True
 
 class SOR(BaseModel):
-    A: list
+    A: list | SparseMatrix | StoredMatrix
+    b: list | None = None
+    B: list | None = None
+    x0: list
+    w: float | Literal["auto"]
+    tol: float
+    niter: int
+    relativeError: bool
+    history: HistoryMode = "full"
+    historyK: int = 10
+    exact: bool = False
+    matrices: bool = False
+    checkConvergence: bool = True
+
+# Preconditioner M of the Krylov methods; ILU(0) keeps the nonzero pattern
+# of A, dense or sparse, and is the complete LU only when A has no zeros
+Preconditioner = Literal["none", "jacobi", "ilu0"]
+
+class CG(BaseModel):
+    A: list | SparseMatrix | StoredMatrix
     b: list
     x0: list
-    w: float
     tol: float
     niter: int
     relativeError: bool
+    preconditioner: Preconditioner = "none"
+    history: HistoryMode = "full"
+    historyK: int = 10
 
-class CompareAll(BaseModel):
-    A: list
+class BiCGSTAB(BaseModel):
+    A: list | SparseMatrix | StoredMatrix
     b: list
     x0: list
-    w: float
     tol: float
     niter: int
-    relativeError: bool  
\ No newline at end of file
+    relativeError: bool
+    preconditioner: Preconditioner = "none"
+    history: HistoryMode = "full"
+    historyK: int = 10
+
+class GMRES(BaseModel):
+    A: list | SparseMatrix | StoredMatrix
+    b: list
+    x0: list
+    tol: float
+    niter: int
+    relativeError: bool
+    preconditioner: Preconditioner = "none"
+    restart: int = 30
+    history: HistoryMode = "full"
+    historyK: int = 10
+
+class Direct(BaseModel):
+    A: list | SparseMatrix | StoredMatrix
+    b: list
+    method: Literal["auto", "lu", "cholesky"] = "auto"
+
+class CompareAll(BaseModel):
+    A: list | SparseMatrix | StoredMatrix
+    b: list | None = None
+    B: list | None = None
+    x0: list
+    w: float | Literal["auto"] = "auto"
+    tol: float
+    niter: int
+    relativeError: bool  
+    timeout: float | None = None
+    maxEvaluations: int | None = None
+    history: HistoryMode = "full"
+    historyK: int = 10
+    exact: bool = False
+    matrices: bool = False
+    checkConvergence: bool = True
+    preconditioner: Preconditioner = "none"
+    restart: int = 30
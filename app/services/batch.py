@@ -0,0 +1,315 @@
+import numpy as np
+from services.expressions import get_function, evaluate_vector
+
+RUNNING = -1
+statuses = [
+    "converged",
+    "failed",
+    "invalid interval",
+    "derivative is zero",
+    "division by zero",
+    "invalid value",
+]
+CONVERGED, FAILED, INVALID_INTERVAL, ZERO_DERIVATIVE, ZERO_DIVISION, \
+    INVALID_VALUE = range(len(statuses))
+
+
+# Calculate the error element-wise
+def error(x1, x0, relative):
+    with np.errstate(all="ignore"):
+        if relative:
+            return np.abs((x1-x0)/x1)
+        return np.abs(x1-x0)
+
+
+# Evaluate f only on the running elements, keeping the rest as they are
+def evaluate_where(f, x, mask, out):
+    out = out.copy()
+    out[mask] = evaluate_vector(f, x[mask])
+    return out
+
+
+# Stop the running elements in mask with the given status and root
+def settle(status, roots, mask, values, code):
+    mask = mask & (status == RUNNING)
+    status[mask] = code
+    if code == CONVERGED:
+        roots[mask] = values[mask]
+
+
+# JSON friendly float (non-finite values become None)
+def to_float(value):
+    return float(value) if np.isfinite(value) else None
+
+
+def to_list(values):
+    return [to_float(v) for v in values]
+
+
+def Bisection(f, a, b, tol, niter, relativeError, history):
+    m = len(a)
+    status, roots = np.full(m, RUNNING), np.full(m, np.nan)
+    iters, E = np.zeros(m, dtype=int), np.full(m, 100.0)
+    fa, fb = evaluate_vector(f, a), evaluate_vector(f, b)
+    xm = (a + b) / 2
+    fm = evaluate_vector(f, xm)
+
+    settle(status, roots, fa == 0, a, CONVERGED)
+    settle(status, roots, fb == 0, b, CONVERGED)
+    settle(status, roots, ~np.isfinite(fa*fb*fm), xm, INVALID_VALUE)
+    settle(status, roots, (b < a) | (fa*fb >= 0), xm, INVALID_INTERVAL)
+    if history is not None:
+        history.append((a, xm, b, fm, E))
+
+    for _ in range(niter):
+        settle(status, roots, fm == 0, xm, CONVERGED)
+        active = status == RUNNING
+        if not active.any():
+            break
+        left = active & (fa*fm > 0)
+        right = active & ~left
+        a, fa = np.where(left, xm, a), np.where(left, fm, fa)
+        b = np.where(right, xm, b)
+        xp, xm = xm, np.where(active, (a + b) / 2, xm)
+        fm = evaluate_where(f, xm, active, fm)
+        E = np.where(active, error(xm, xp, relativeError), E)
+        iters[active] += 1
+        if history is not None:
+            history.append((a, xm, b, fm, E))
+
+        settle(status, roots, active & ~np.isfinite(fm), xm, INVALID_VALUE)
+        settle(status, roots, active & (E < tol), xm, CONVERGED)
+
+    settle(status, roots, status == RUNNING, xm, FAILED)
+    return roots, iters, E, status
+
+
+def False_position(f, a, b, tol, niter, relativeError, history):
+    m = len(a)
+    status, roots = np.full(m, RUNNING), np.full(m, np.nan)
+    iters, E = np.zeros(m, dtype=int), np.full(m, 100.0)
+    fa, fb = evaluate_vector(f, a), evaluate_vector(f, b)
+    with np.errstate(all="ignore"):
+        xm = b - fb*(b-a)/(fb-fa)
+    fm = evaluate_vector(f, xm)
+
+    settle(status, roots, fa == 0, a, CONVERGED)
+    settle(status, roots, fb == 0, b, CONVERGED)
+    settle(status, roots, ~np.isfinite(fa*fb*fm), xm, INVALID_VALUE)
+    settle(status, roots, (b < a) | (fa*fb >= 0), xm, INVALID_INTERVAL)
+    if history is not None:
+        history.append((a, xm, b, fm, E))
+
+    for _ in range(niter):
+        settle(status, roots, fm == 0, xm, CONVERGED)
+        active = status == RUNNING
+        if not active.any():
+            break
+        left = active & (fm*fb < 0)
+        right = active & ~left
+        a, fa = np.where(left, xm, a), np.where(left, fm, fa)
+        b, fb = np.where(right, xm, b), np.where(right, fm, fb)
+        with np.errstate(all="ignore"):
+            xp, xm = xm, np.where(active, b - fb*(b-a)/(fb-fa), xm)
+        fm = evaluate_where(f, xm, active, fm)
+        E = np.where(active, error(xm, xp, relativeError), E)
+        iters[active] += 1
+        if history is not None:
+            history.append((a, xm, b, fm, E))
+
+        settle(status, roots, active & ~np.isfinite(fm), xm, INVALID_VALUE)
+        settle(status, roots, active & (E < tol), xm, CONVERGED)
+
+    settle(status, roots, status == RUNNING, xm, FAILED)
+    return roots, iters, E, status
+
+
+# False position where an endpoint retained twice in a row has its f value
+# halved, so both ends of every bracket keep moving (superlinear instead of
+# the one-sided linear convergence of plain false position)
+def Illinois(f, a, b, tol, niter, relativeError, history):
+    m = len(a)
+    status, roots = np.full(m, RUNNING), np.full(m, np.nan)
+    iters, E = np.zeros(m, dtype=int), np.full(m, 100.0)
+    fa, fb = evaluate_vector(f, a), evaluate_vector(f, b)
+    with np.errstate(all="ignore"):
+        xm = b - fb*(b-a)/(fb-fa)
+    fm = evaluate_vector(f, xm)
+    # Endpoint kept by the last step of every element
+    keptA, keptB = np.zeros(m, dtype=bool), np.zeros(m, dtype=bool)
+
+    settle(status, roots, fa == 0, a, CONVERGED)
+    settle(status, roots, fb == 0, b, CONVERGED)
+    settle(status, roots, ~np.isfinite(fa*fb*fm), xm, INVALID_VALUE)
+    settle(status, roots, (b < a) | (fa*fb >= 0), xm, INVALID_INTERVAL)
+    if history is not None:
+        history.append((a, xm, b, fm, E))
+
+    for _ in range(niter):
+        settle(status, roots, fm == 0, xm, CONVERGED)
+        active = status == RUNNING
+        if not active.any():
+            break
+        left = active & (fm*fb < 0)
+        right = active & ~left
+        fb = np.where(left & keptB, fb/2, fb)
+        fa = np.where(right & keptA, fa/2, fa)
+        a, fa = np.where(left, xm, a), np.where(left, fm, fa)
+        b, fb = np.where(right, xm, b), np.where(right, fm, fb)
+        keptA, keptB = np.where(active, right, keptA), \
+            np.where(active, left, keptB)
+        with np.errstate(all="ignore"):
+            xp, xm = xm, np.where(active, b - fb*(b-a)/(fb-fa), xm)
+        fm = evaluate_where(f, xm, active, fm)
+        E = np.where(active, error(xm, xp, relativeError), E)
+        iters[active] += 1
+        if history is not None:
+            history.append((a, xm, b, fm, E))
+
+        settle(status, roots, active & ~np.isfinite(fm), xm, INVALID_VALUE)
+        settle(status, roots, active & (E < tol), xm, CONVERGED)
+
+    settle(status, roots, status == RUNNING, xm, FAILED)
+    return roots, iters, E, status
+
+
+def Newton(f, fd, x0, tol, niter, relativeError, history):
+    m = len(x0)
+    status, roots = np.full(m, RUNNING), np.full(m, np.nan)
+    iters, E = np.zeros(m, dtype=int), np.full(m, 100.0)
+    x = x0
+    fx = evaluate_vector(f, x)
+
+    settle(status, roots, fx == 0, x, CONVERGED)
+    settle(status, roots, ~np.isfinite(fx), x, INVALID_VALUE)
+    if history is not None:
+        history.append((x, fx, E))
+
+    for _ in range(niter):
+        active = status == RUNNING
+        if not active.any():
+            break
+        fdx = evaluate_where(fd, x, active, np.ones(m))
+        settle(status, roots, active & (fdx == 0), x, ZERO_DERIVATIVE)
+        settle(status, roots, active & ~np.isfinite(fdx), x, INVALID_VALUE)
+        active = status == RUNNING
+        with np.errstate(all="ignore"):
+            xp, x = x, np.where(active, x - fx/fdx, x)
+        fx = evaluate_where(f, x, active, fx)
+        E = np.where(active, error(x, xp, relativeError), E)
+        iters[active] += 1
+        if history is not None:
+            history.append((x, fx, E))
+
+        settle(status, roots, active & ~np.isfinite(fx), x, INVALID_VALUE)
+        settle(status, roots, active & ((fx == 0) | (E < tol)), x, CONVERGED)
+
+    settle(status, roots, status == RUNNING, x, FAILED)
+    return roots, iters, E, status
+
+
+def Secant(f, x0, x1, tol, niter, relativeError, history):
+    m = len(x0)
+    status, roots = np.full(m, RUNNING), np.full(m, np.nan)
+    iters, E = np.zeros(m, dtype=int), np.full(m, 100.0)
+    fx0, fx1 = evaluate_vector(f, x0), evaluate_vector(f, x1)
+
+    settle(status, roots, fx0 == 0, x0, CONVERGED)
+    settle(status, roots, fx1 == 0, x1, CONVERGED)
+    settle(status, roots, ~np.isfinite(fx0*fx1), x1, INVALID_VALUE)
+    if history is not None:
+        history.append((x0, fx0, E))
+        history.append((x1, fx1, E))
+
+    for _ in range(niter):
+        active = status == RUNNING
+        if not active.any():
+            break
+        settle(status, roots, active & (fx1 == fx0), x1, ZERO_DIVISION)
+        active = status == RUNNING
+        with np.errstate(all="ignore"):
+            x2 = np.where(active, x1 - fx1*(x1-x0)/(fx1-fx0), x1)
+        fx2 = evaluate_where(f, x2, active, fx1)
+        E = np.where(active, error(x2, x1, relativeError), E)
+        iters[active] += 1
+        if history is not None:
+            history.append((x2, fx2, E))
+
+        settle(status, roots, active & ~np.isfinite(fx2), x2, INVALID_VALUE)
+        settle(status, roots, active & ((fx2 == 0) | (E < tol)), x2, CONVERGED)
+        x0, fx0 = np.where(active, x1, x0), np.where(active, fx1, fx0)
+        x1, fx1 = x2, fx2
+
+    settle(status, roots, status == RUNNING, x1, FAILED)
+    return roots, iters, E, status
+
+
+# Rebuild the iteration table of a single element from the history
+def element_table(history, columns, i, rows):
+    return {
+        "columns": columns,
+        "rows": [[n] + [to_float(col[i]) for col in history[n]]
+                 for n in range(rows)],
+    }
+
+
+def Batch(
+        method: str,
+        fx: str,
+        a: list,
+        b: list,
+        x0: list,
+        x1: list,
+        tol: float,
+        niter: int,
+        relativeError: bool,
+        tables: bool = False) -> (dict, str):
+    try:
+        function = get_function(fx)
+        f = function.vector()
+    except Exception:
+        return None, "Invalid function"
+
+    history = [] if tables else None
+    try:
+        if method in ("bisection", "false_position", "illinois"):
+            a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+            if a.ndim != 1 or a.shape != b.shape or len(a) == 0:
+                return None, "a and b must be non-empty lists of equal length"
+            solver = {"bisection": Bisection,
+                      "false_position": False_position,
+                      "illinois": Illinois}[method]
+            result = solver(f, a, b, tol, niter, relativeError, history)
+            columns, offset = ["n", "a", "xm", "b", "f(xm)", "error"], 1
+        elif method == "newton":
+            x0 = np.asarray(x0, dtype=float)
+            if x0.ndim != 1 or len(x0) == 0:
+                return None, "x0 must be a non-empty list"
+            fd = function.vector(1)
+            result = Newton(f, fd, x0, tol, niter, relativeError, history)
+            columns, offset = ["n", "x", "f(x)", "error"], 1
+        elif method == "secant":
+            x0, x1 = np.asarray(x0, dtype=float), np.asarray(x1, dtype=float)
+            if x0.ndim != 1 or x0.shape != x1.shape or len(x0) == 0:
+                return None, "x0 and x1 must be non-empty lists of equal length"
+            result = Secant(f, x0, x1, tol, niter, relativeError, history)
+            columns, offset = ["n", "x", "f(x)", "error"], 2
+        else:
+            return None, f'Unknown method {method}'
+    except Exception:
+        return None, "Error in the input"
+
+    roots, iters, E, status = result
+    converged = status == CONVERGED
+    data = {
+        "converged": int(converged.sum()),
+        "failed": int((~converged).sum()),
+        "columns": ["i", "root", "iterations", "error", "status"],
+        "rows": [[i, root, int(iters[i]), err, statuses[status[i]]]
+                 for i, (root, err) in enumerate(zip(to_list(roots),
+                                                     to_list(E)))],
+    }
+    if tables:
+        data["tables"] = [element_table(history, columns, i, iters[i] + offset)
+                          for i in range(len(roots))]
+    return data, None
@@ -0,0 +1,67 @@
+import threading
+import time
+from decouple import config
+from services.metrics import count, measure
+
+TIMEOUT = config("COMPARE_TIMEOUT", default=5.0, cast=float)
+MAX_EVALUATIONS = config("COMPARE_MAX_EVALUATIONS", default=100000, cast=int)
+
+_local = threading.local()
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+# Wall-clock and evaluation budget of a single method run. The clock starts
+# when the method starts running, not when it is queued.
+class Budget:
+    def __init__(self, seconds, evaluations):
+        self.seconds = seconds
+        self.deadline = None
+        self.limit = evaluations
+        self.evaluations = 0
+
+    def start(self):
+        self.deadline = time.perf_counter() + self.seconds
+
+    def spend(self, n=1):
+        self.evaluations += n
+        if self.evaluations > self.limit:
+            raise BudgetExceeded("Evaluation budget exceeded")
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise BudgetExceeded("Time budget exceeded")
+
+
+# Count evaluations and charge them to the budget of the current thread
+def charge(n=1):
+    count(n)
+    budget = getattr(_local, "budget", None)
+    if budget is not None:
+        budget.spend(n)
+
+
+# Run a method under a budget, returning its outcome and cost
+def run_with_budget(method, budget):
+    _local.budget = budget
+    budget.start()
+    start = time.perf_counter()
+    try:
+        (result, metrics), exception = measure(method), None
+    except Exception as e:
+        result, metrics, exception = None, None, e
+    finally:
+        _local.budget = None
+    return {
+        "result": result,
+        "exception": exception,
+        "metrics": metrics,
+        "time": time.perf_counter() - start,
+        "evaluations": budget.evaluations,
+    }
+
+
+# Run a method under a fresh budget; the budget is created (and its clock
+# started) where the method runs, which may be a worker process
+def run_budgeted(method, seconds, evaluations):
+    return run_with_budget(method, Budget(seconds, evaluations))
@@ -0,0 +1,241 @@
+import copy
+import math
+import numpy as np
+from services.budget import charge
+
+# Convergence pre-check of the stationary methods x = T x + C: the spectral
+# radius of T is found before iterating, and systems with rho(T) >= 1 are
+# turned away instead of running up to niter. It is an Arnoldi estimate of
+# a few dozen sweeps, far cheaper than the solve; only tiny systems (up to
+# EIGEN_SIZE unknowns), where forming T costs no more than that, get the
+# exact eigenvalues. Non-normal T can push the estimate above 1 while the
+# iteration converges (the steps grow for a while before they shrink), so
+# rho >= 1 only turns a system away when the estimate is exact, and is
+# otherwise reported as a warning.
+EIGEN_SIZE = 32
+RTOL = 2e-2
+# Automatic SOR relaxation: tolerance on rho(T_GS) = rho(T_J)^2 for Young's
+# formula, and the budget of the fallback search (relaxation factors tried,
+# sweeps per factor)
+YOUNG_RTOL = 0.1
+SEARCH_STEPS = 5
+SEARCH_SWEEPS = 15
+SEARCH_MIN = 0.5
+SEARCH_MAX = 1.95
+# Arnoldi steps, and the cap on the stored basis (floats)
+KRYLOV_STEPS = 30
+KRYLOV_BASIS = 2**23
+
+
+# The same sweeps with another right-hand side
+def with_rhs(sweeps, b):
+    sweeps = copy.copy(sweeps)
+    sweeps.b = b
+    return sweeps
+
+
+# The same sweeps with b = 0, i.e. the linear part e -> T e (on vectors,
+# also for sweeps over a block of right-hand sides)
+def homogeneous(sweeps):
+    return with_rhs(sweeps, np.zeros(len(sweeps.b)))
+
+
+# The same sweeps with another relaxation factor
+def relaxed(sweeps, w):
+    sweeps = copy.copy(sweeps)
+    sweeps.w = w
+    return sweeps
+
+
+# Unit starting vector for the estimates. Starting from the first step
+# x(1) - x(0) follows the components the iteration actually has to damp; a
+# random part of relative size `noise` makes sure no eigenvector is missed.
+def start_vector(start, noise=1e-3):
+    v = np.random.default_rng(0).standard_normal(len(start))
+    v *= noise / np.linalg.norm(v)
+    norm = np.linalg.norm(start)
+    if norm > 0 and np.isfinite(norm):
+        v += start / norm
+    return v / np.linalg.norm(v)
+
+
+# Largest Ritz value modulus of the Krylov space of apply from `start`
+# (Arnoldi), and whether it is exact (the space is invariant, so the Ritz
+# values are eigenvalues). Much sharper than power iteration when rho is
+# close to 1, which Young's formula is sensitive to; stops once the estimate
+# of 1 - rho settles. The start is mixed evenly with noise: slow modes the
+# first step barely excites still decide the best w.
+def krylov_estimate(apply, start, steps=KRYLOV_STEPS, rtol=RTOL):
+    n = len(start)
+    steps = max(2, min(steps, KRYLOV_BASIS // n))
+    V = np.empty((steps + 1, n))
+    H = np.zeros((steps + 1, steps))
+    V[0] = start_vector(start, 1.0)
+    rho = None
+    for j in range(steps):
+        charge()
+        v = apply(V[j].copy())
+        # Classical Gram-Schmidt, repeated once for orthogonality
+        for _ in range(2):
+            h = V[:j+1] @ v
+            v -= h @ V[:j+1]
+            H[:j+1, j] += h
+        H[j+1, j] = np.linalg.norm(v)
+        if not np.isfinite(H[:j+2, j]).all():
+            return math.inf, False
+        estimate = float(np.abs(np.linalg.eigvals(H[:j+1, :j+1])).max())
+        if H[j+1, j] <= 1e-12 * np.abs(H[:j+1, j]).max(initial=1e-300):
+            return estimate, True
+        if rho is not None and abs(estimate - rho) <= \
+                rtol * min(estimate, abs(1 - estimate)):
+            return estimate, False
+        rho = estimate
+        V[j+1] = v / H[j+1, j]
+    return rho, False
+
+
+def krylov_radius(apply, start, steps=KRYLOV_STEPS, rtol=RTOL):
+    return krylov_estimate(apply, start, steps, rtol)[0]
+
+
+# Spectral radius of the sweep operator `apply` (on the homogeneous sweeps
+# `linear`), and whether it is exact: the Arnoldi estimate from `start`, or
+# for tiny systems the eigenvalues of T, built by sweeping the identity as a
+# block of right-hand sides
+def sweep_radius(linear, method, start):
+    n = len(start)
+    if n > EIGEN_SIZE:
+        apply = linear.jacobi if method == "jacobi" else linear.sor
+        return krylov_estimate(apply, start)
+    charge(n)
+    block = with_rhs(linear, np.zeros((n, n)))
+    if method == "jacobi":
+        T = block.jacobi(np.eye(n))
+    else:
+        T = block.sor(np.eye(n))
+    if not np.isfinite(T).all():
+        return math.inf, True
+    return float(np.abs(np.linalg.eigvals(T)).max()), True
+
+
+# Iterations until the step ||x(k) - x(k-1)||, which shrinks by about rho
+# per iteration from the first step `first`, falls below tol
+def iterations_needed(rho, first, tol):
+    if not math.isfinite(first):
+        return None
+    if first <= tol or rho == 0:
+        return 1
+    if rho >= 1:
+        return None
+    return 1 + math.ceil(math.log(tol / first) / math.log(rho))
+
+
+# Error of the first iteration; `step` is x(1) - x(0) and `x1` the first
+# iterate
+def first_error(step, x1, relativeError):
+    first = float(np.abs(step).max())
+    if relativeError:
+        with np.errstate(all="ignore"):
+            first = first / float(np.abs(x1).max())
+    return first
+
+
+# Summary reported with the result, or the error when the method diverges;
+# an estimated (not exact) rho >= 1 only adds a warning to the summary
+def check(rho, step, x1, tol, relativeError, exact=True):
+    first = first_error(step, x1, relativeError)
+    if rho >= 1 and first > tol and exact:
+        return None, f'Spectral radius {rho:.4g} >= 1, the method diverges'
+    summary = {
+        "spectralRadius": rho,
+        "estimatedIterations": iterations_needed(rho, first, tol),
+    }
+    if rho >= 1 and first > tol:
+        summary["warning"] = f'Estimated spectral radius {rho:.4g} >= 1, ' \
+            'the method may diverge'
+    return summary, None
+
+
+# Fraction of the Gauss-Seidel iterations saved when rho(T) drops from
+# `before` to `after` (iterations scale with 1 / -log(rho))
+def saving(before, after):
+    if after >= 1 or before <= 0:
+        return 0.0
+    if before >= 1 or after <= 0:
+        return 1.0
+    return max(0.0, 1 - math.log(before) / math.log(after))
+
+
+# Average contraction per sweep over `steps` sweeps of apply from `start`,
+# transient growth included. It ranks relaxation factors reliably even where
+# T_w is far from normal and its Ritz values are not.
+def contraction(apply, start, steps=SEARCH_SWEEPS):
+    v = start_vector(start, 1.0)
+    total = 0.0
+    for _ in range(steps):
+        charge()
+        v = apply(v)
+        norm = np.linalg.norm(v)
+        if norm == 0:
+            return 0.0
+        if not np.isfinite(norm):
+            return math.inf
+        total += math.log(norm)
+        v /= norm
+    return math.exp(total / steps)
+
+
+# Golden-section search over [SEARCH_MIN, SEARCH_MAX] for the w with the
+# best contraction; returns w, its contraction and that of w = 1
+def search_w(linear, start):
+    def rate(w):
+        return contraction(relaxed(linear, w).sor, start)
+
+    ratio = (math.sqrt(5) - 1) / 2
+    a, b = SEARCH_MIN, SEARCH_MAX
+    c, d = b - ratio*(b - a), a + ratio*(b - a)
+    tried = {1.0: rate(1.0), c: rate(c), d: rate(d)}
+    for _ in range(SEARCH_STEPS - 2):
+        if tried[c] <= tried[d]:
+            b, d = d, c
+            c = b - ratio*(b - a)
+            tried[c] = rate(c)
+        else:
+            a, c = c, d
+            d = a + ratio*(b - a)
+            tried[d] = rate(d)
+    w = min(tried, key=tried.get)
+    return w, tried[w], tried[1.0]
+
+
+# SOR relaxation factor for w = "auto". For consistently ordered matrices
+# rho(T_GS) = rho(T_J)^2 and Young's formula w = 2 / (1 + sqrt(1 - rho_J^2))
+# is optimal with rho(T_w) = w - 1; otherwise fall back to a short search,
+# unless Gauss-Seidel needs fewer sweeps than the search would cost.
+# Returns w and the report of the choice.
+def optimal_w(sweeps, x0, tol, relativeError):
+    linear = homogeneous(relaxed(sweeps, 1))
+    rhoJ = krylov_radius(linear.jacobi, sweeps.jacobi(x0) - x0)
+    x1 = relaxed(sweeps, 1).sor(x0.copy())
+    start = x1 - x0
+    rhoGS = krylov_radius(linear.sor, start)
+    needed = iterations_needed(rhoGS, first_error(start, x1, relativeError),
+                               tol)
+    if rhoJ < 1 and abs(rhoGS - rhoJ**2) <= YOUNG_RTOL * rhoJ**2:
+        w = 2 / (1 + math.sqrt(1 - rhoJ**2))
+        rho, selection = w - 1, "young"
+        estimatedSaving = saving(rhoGS, rho)
+    elif needed is not None and needed <= (SEARCH_STEPS + 1)*SEARCH_SWEEPS:
+        w, rho, selection, estimatedSaving = 1.0, rhoGS, "gauss-seidel", 0.0
+    else:
+        w, rate, rateGS = search_w(linear, start)
+        rho, selection = rate, "search"
+        estimatedSaving = saving(rateGS, rate)
+    return w, {
+        "w": w,
+        "selection": selection,
+        "spectralRadius": rho,
+        "jacobiSpectralRadius": rhoJ,
+        "gaussSeidelSpectralRadius": rhoGS,
+        "estimatedSaving": estimatedSaving,
+    }
@@ -0,0 +1,260 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from decouple import config
+from services.metrics import measure, phase
+from services.ingest import resolve
+from services.sparse import CSRMatrix, from_input
+from services.workers import run
+
+# Factorizations are kept in an LRU cache of the server process keyed on a
+# hash of the matrix contents, so repeated solves with the same A only pay
+# for the O(n^2) triangular solves whichever worker runs them. The workers
+# get the cached factors with the task and send new ones back. The cache is
+# bounded by the bytes it holds, for the whole pool.
+CACHE_BYTES = config("DIRECT_CACHE_BYTES", default=256*2**20, cast=int)
+# Rows per block of the factorization and of the triangular solves
+BLOCK = 64
+
+
+class SingularMatrix(ArithmeticError):
+    pass
+
+
+# LU with partial pivoting, P A = L U, blocked by panels of BLOCK columns.
+# Returns L and U packed in one array (unit diagonal of L implied) and the
+# row permutation.
+def lu_factor(A):
+    A = np.array(A, dtype=float)
+    n = len(A)
+    perm = np.arange(n)
+    for s in range(0, n, BLOCK):
+        e = min(s + BLOCK, n)
+        # Unblocked elimination of the panel, swapping whole rows
+        for k in range(s, e):
+            p = k + int(np.argmax(np.abs(A[k:, k])))
+            if A[p, k] == 0:
+                raise SingularMatrix("Matrix is singular")
+            if p != k:
+                A[[k, p]] = A[[p, k]]
+                perm[[k, p]] = perm[[p, k]]
+            A[k+1:, k] /= A[k, k]
+            A[k+1:, k+1:e] -= np.outer(A[k+1:, k], A[k, k+1:e])
+        if e < n:
+            # U12 = L11^-1 A12, then the trailing update A22 -= L21 U12
+            L11 = np.tril(A[s:e, s:e], -1) + np.eye(e - s)
+            A[s:e, e:] = np.linalg.solve(L11, A[s:e, e:])
+            A[e:, e:] -= A[e:, s:e] @ A[s:e, e:]
+    return A, perm
+
+
+# Triangular solves by blocks of rows: the solved part enters as one
+# matrix-vector product and only the small diagonal blocks are solved
+def forward(blocks, L, b):
+    x = np.array(b, dtype=float)
+    for s, e, T in blocks:
+        x[s:e] = np.linalg.solve(T, x[s:e] - L[s:e, :s] @ x[:s])
+    return x
+
+
+def backward(blocks, U, b):
+    x = np.array(b, dtype=float)
+    for s, e, T in reversed(blocks):
+        x[s:e] = np.linalg.solve(T, x[s:e] - U[s:e, e:] @ x[e:])
+    return x
+
+
+def diagonal_blocks(M, lower, unit=False):
+    blocks = []
+    for s in range(0, len(M), BLOCK):
+        e = min(s + BLOCK, len(M))
+        T = np.tril(M[s:e, s:e]) if lower else np.triu(M[s:e, s:e])
+        if unit:
+            np.fill_diagonal(T, 1.0)
+        blocks.append((s, e, T))
+    return blocks
+
+
+class Factorization:
+    def __init__(self, method, factor, perm=None):
+        self.method = method
+        self.factor = factor
+        self.perm = perm
+        if method == "lu":
+            self.lower = diagonal_blocks(factor, True, unit=True)
+            self.upper = diagonal_blocks(factor, False)
+        else:
+            self.lower = diagonal_blocks(factor, True)
+            self.upper = diagonal_blocks(factor.T, False)
+
+    # Only the factors are pickled; the diagonal blocks are rebuilt
+    def __reduce__(self):
+        return Factorization, (self.method, self.factor, self.perm)
+
+    @property
+    def nbytes(self):
+        return self.factor.nbytes + (0 if self.perm is None else
+                                     self.perm.nbytes)
+
+    def solve(self, b):
+        if self.method == "lu":
+            y = forward(self.lower, self.factor, b[self.perm])
+            return backward(self.upper, self.factor, y)
+        y = forward(self.lower, self.factor, b)
+        return backward(self.upper, self.factor.T, y)
+
+
+def symmetric(A):
+    return np.abs(A - A.T).max(initial=0) <= \
+        1e-12 * np.abs(A).max(initial=0)
+
+
+# Cholesky for SPD matrices, LU otherwise; "auto" tries Cholesky on
+# symmetric matrices and falls back to LU
+def factorize(A, method):
+    if method in ("auto", "cholesky"):
+        if method == "cholesky" and not symmetric(A):
+            raise np.linalg.LinAlgError("Matrix is not symmetric")
+        if method == "cholesky" or symmetric(A):
+            try:
+                return Factorization("cholesky", np.linalg.cholesky(A))
+            except np.linalg.LinAlgError:
+                if method == "cholesky":
+                    raise
+    return Factorization("lu", *lu_factor(A))
+
+
+# Content hash of a matrix; equal matrices share the key whatever their
+# input format was
+def fingerprint(A):
+    digest = hashlib.sha256()
+    digest.update(np.asarray(A.shape, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(A).tobytes())
+    return digest.hexdigest()
+
+
+# LRU cache of factorizations keyed on the matrix fingerprint and the
+# requested method, bounded by the bytes of the stored factors
+class FactorizationCache:
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Cached factorization for key, or None
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        if entry.nbytes > self.maxbytes:
+            return
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = entry
+                self.nbytes += entry.nbytes
+            self._entries.move_to_end(key)
+            while self.nbytes > self.maxbytes:
+                _, old = self._entries.popitem(last=False)
+                self.nbytes -= old.nbytes
+
+    def info(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "bytes": self.nbytes,
+                "maxbytes": self.maxbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = self.misses = 0
+
+
+factorization_cache = FactorizationCache(CACHE_BYTES)
+
+
+# Parse A and b and look up the factorization of A; returns (A, b, key,
+# factorization) or the error
+def prepare(A, b, method):
+    try:
+        A = resolve(A)
+    except KeyError:
+        return "Unknown matrix id"
+    try:
+        with phase("parse"):
+            if isinstance(A, (dict, CSRMatrix)):
+                A = from_input(A).to_dense()
+            else:
+                A = np.asarray(A, dtype=float)
+            b = np.asarray(b, dtype=float).ravel()
+        if A.ndim != 2 or A.shape[0] != A.shape[1] or len(b) != len(A):
+            return "Invalid dimensions"
+        if not np.isfinite(A).all() or not np.isfinite(b).all():
+            return "Error in the input"
+    except Exception:
+        return "Error in the input"
+    with phase("setup"):
+        key = (fingerprint(A), method)
+        return A, b, key, factorization_cache.get(key)
+
+
+# Runs in a worker: factorize A unless its factorization came with the task,
+# then solve. Returns (data, error, factorization).
+def Solve(A, b, method, factorization=None):
+    try:
+        with phase("setup"):
+            if factorization is None:
+                factorization = factorize(A, method)
+    except SingularMatrix as e:
+        return None, str(e), None
+    except np.linalg.LinAlgError:
+        return None, "Matrix is not symmetric positive definite", None
+
+    x = factorization.solve(b)
+    if not np.isfinite(x).all():
+        return None, "Matrix is singular", None
+    return {
+        "x": x.tolist(),
+        "method": factorization.method,
+        "residual": float(np.abs(A @ x - b).max(initial=0)),
+    }, None, factorization
+
+
+# Runs in the server process, around the worker call; returns
+# ((data, error), metrics) like the pool
+def Direct(
+        A: list | dict,
+        b: list,
+        method: str = "auto") -> ((dict, str), dict):
+    prepared, local = measure(lambda: prepare(A, b, method))
+    if isinstance(prepared, str):
+        return (None, prepared), local
+    A, b, key, cached = prepared
+
+    (data, error, factorization), metrics = run(Solve, A, b, method, cached)
+    if cached is None and factorization is not None:
+        factorization_cache.put(key, factorization)
+    if data is not None:
+        data["cacheHit"] = cached is not None
+
+    metrics["time"] += local["time"]
+    for name, seconds in local["phases"].items():
+        if name != "iterate":
+            metrics["phases"][name] = \
+                metrics["phases"].get(name, 0.0) + seconds
+    return (data, error), metrics
@@ -0,0 +1,317 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from decouple import config
+import mpmath
+import numpy as np
+import sympy as sy
+import services.parser as parser
+from services.budget import charge
+from services.metrics import phase
+
+xSym = sy.symbols("x")
+
+CACHE_SIZE = config("EXPR_CACHE_SIZE", default=256, cast=int)
+# Digits used when an iteration is escalated to arbitrary precision, and the
+# relative size of a - b (against max(|a|, |b|)) below which the difference
+# is considered a catastrophic cancellation
+PRECISION_DIGITS = config("PRECISION_DIGITS", default=50, cast=int)
+CANCELLATION = config("PRECISION_CANCELLATION", default=1e-8, cast=float)
+
+# Private mpmath context at a fixed precision: the global mpmath context is
+# shared by every thread and must not be reconfigured per request
+mpContext = mpmath.MPContext()
+mpContext.dps = PRECISION_DIGITS
+mpNamespace = {name: getattr(mpContext, name)
+               for name in dir(mpContext) if not name.startswith("_")}
+mpNamespace["mpmath"] = mpContext
+
+
+# Evaluate the compiled function at a given point
+def evaluate(f, x):
+    charge()
+    try:
+        return float(f(x))
+    except (ArithmeticError, ValueError):
+        if not hasattr(f, "fallback"):
+            raise
+        return float(f.fallback(x))
+
+
+# Evaluate a fused kernel at a given point; one call yields f and its
+# derivatives together
+def evaluate_all(f, x):
+    charge()
+    try:
+        values = f(x)
+    except (ArithmeticError, ValueError):
+        if not hasattr(f, "fallback"):
+            raise
+        values = f.fallback(x)
+    return tuple(float(v) for v in values)
+
+
+# Evaluate a precise (mpmath) kernel at a given point
+def evaluate_precise(f, x):
+    charge()
+    return f(mpContext.mpf(x))
+
+
+# Whether a - b loses most of its significant digits (or is exactly zero
+# while a and b are not); inf and nan never count as a cancellation
+def cancels(a, b):
+    scale = max(abs(a), abs(b))
+    return 0 < scale < float("inf") and abs(a - b) <= CANCELLATION * scale
+
+
+# Evaluate the vectorized function over an array of points
+def evaluate_vector(f, x):
+    charge(np.size(x))
+    with np.errstate(all="ignore"):
+        fx = np.asarray(f(x), dtype=float)
+    return np.broadcast_to(fx, np.shape(x)).copy()
+
+
+# Normalize an expression string so equivalent inputs share a cache key
+def normalize(expr):
+    return " ".join(expr.replace("^", "**").split())
+
+
+# Parse a numeric parameter
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_param(expr):
+    with phase("parse"):
+        tree = parser.parse(expr, ())
+    return float(parser.compile_tree(tree, ())())
+
+
+# Parse a function expression into a syntax tree
+def parse_tree(expr, variables=("x",)):
+    with phase("parse"):
+        return parser.parse(expr, variables)
+
+
+# Parse a function expression into a SymPy tree (for symbolic work)
+def parse_sym(expr, variables=("x",)):
+    tree = parse_tree(expr, variables)
+    with phase("parse"):
+        return parser.to_sympy(tree, {v: sy.symbols(v) for v in variables})
+
+
+# math raises on log(0), division by zero or overflow where the SymPy
+# evaluation returns inf or nan; compiled callables carry a SymPy fallback
+# that the evaluators use at those points
+def with_fallback(fast, fallback):
+    fast.fallback = fallback
+    return fast
+
+
+# Evaluate SymPy trees (one or a sequence) numerically at a given point
+def evalf(exprs, symbols, args):
+    subs = dict(zip(symbols, args))
+    if isinstance(exprs, (list, tuple)):
+        return tuple(float(e.evalf(subs=subs)) for e in exprs)
+    return float(exprs.evalf(subs=subs))
+
+
+# Compile a SymPy tree into a float64 callable
+def compile_func(expr, symbols=(xSym,)):
+    with phase("compile"):
+        fast = sy.lambdify(symbols, expr, modules="math")
+    return with_fallback(fast, lambda *args: evalf(expr, symbols, args))
+
+
+# Compile a SymPy tree into a vectorized NumPy callable
+def compile_vector(expr, symbols=(xSym,)):
+    with phase("compile"):
+        return sy.lambdify(symbols, expr, modules="numpy")
+
+
+# Compile f and its derivatives into a single float64 callable returning all
+# of them, computing the common subexpressions only once
+def compile_fused(exprs, symbols=(xSym,)):
+    with phase("compile"):
+        fast = sy.lambdify(symbols, exprs, modules="math", cse=True)
+    return with_fallback(fast,
+                         lambda *args: evalf(exprs, symbols, args))
+
+
+# Compile f and its derivatives into an mpmath callable returning all of them
+# at PRECISION_DIGITS digits
+def compile_precise(exprs, symbols=(xSym,)):
+    with phase("compile"):
+        return sy.lambdify(symbols, exprs, modules=[mpNamespace, "mpmath"])
+
+
+# Syntax tree, compiled evaluator and lazily built SymPy tree and
+# derivatives (always with respect to the first variable)
+class ParsedFunction:
+    def __init__(self, tree, variables=("x",)):
+        self.tree = tree
+        self.variables = variables
+        self.symbols = tuple(sy.symbols(v) for v in variables)
+        # Polynomials in expanded form are evaluated by Horner's rule, with
+        # derivatives from the same pass and without SymPy
+        self.coefficients = None
+        if len(variables) == 1:
+            coefficients = parser.polynomial(tree, variables[0])
+            if coefficients is not None and len(coefficients) > 0:
+                self.coefficients = coefficients
+        with phase("compile"):
+            if self.coefficients is not None:
+                self.func = parser.compile_horner(self.coefficients)
+            else:
+                self.func = with_fallback(
+                    parser.compile_tree(tree, variables),
+                    lambda *args: evalf(self.expr, self.symbols, args))
+        self._syms = []
+        self._funcs = [self.func]
+        self._vectors = {}
+        self._fused = {}
+        self._lock = threading.Lock()
+
+    # SymPy tree, built on first use
+    @property
+    def expr(self):
+        return self.diff(0)
+
+    # Symbolic derivative of the given order
+    def diff(self, order=1):
+        with self._lock:
+            if not self._syms:
+                with phase("parse"):
+                    self._syms.append(parser.to_sympy(
+                        self.tree, dict(zip(self.variables, self.symbols))))
+            while len(self._syms) <= order:
+                with phase("compile"):
+                    self._syms.append(sy.diff(self._syms[-1],
+                                              self.symbols[0]))
+            return self._syms[order]
+
+    # Compiled derivative of the given order
+    def derivative(self, order=1):
+        if self.coefficients is not None:
+            return self._horner(order, 0)
+        self.diff(order)
+        with self._lock:
+            while len(self._funcs) <= order:
+                self._funcs.append(compile_func(
+                    self._syms[len(self._funcs)], self.symbols))
+            return self._funcs[order]
+
+    # Horner evaluator of the derivative of the given order, together with
+    # the next `extra` derivatives
+    def _horner(self, order, extra):
+        key = ("horner", order, extra)
+        with self._lock:
+            if key not in self._vectors:
+                with phase("compile"):
+                    self._vectors[key] = parser.compile_horner(
+                        np.polyder(self.coefficients, order), extra)
+            return self._vectors[key]
+
+    # Fused evaluator returning (f, f', ..., f^(order)) from one call
+    def fused(self, order=2):
+        if self.coefficients is not None:
+            return self._horner(0, order)
+        syms = [self.diff(i) for i in range(order + 1)]
+        with self._lock:
+            if order not in self._fused:
+                self._fused[order] = compile_fused(syms, self.symbols)
+            return self._fused[order]
+
+    # Precise evaluator returning (f, ..., f^(order)) as mpmath numbers
+    def precise(self, order=0):
+        syms = [self.diff(i) for i in range(order + 1)]
+        with self._lock:
+            key = ("precise", order)
+            if key not in self._fused:
+                self._fused[key] = compile_precise(syms, self.symbols)
+            return self._fused[key]
+
+    # Vectorized (NumPy) evaluator of the given derivative order
+    def vector(self, order=0):
+        if self.coefficients is not None:
+            return self._horner(order, 0)
+        if order == 0:
+            with self._lock:
+                if order not in self._vectors:
+                    with phase("compile"):
+                        self._vectors[order] = parser.compile_tree(
+                            self.tree, self.variables, vectorized=True)
+                return self._vectors[order]
+        sym = self.diff(order)
+        with self._lock:
+            if order not in self._vectors:
+                self._vectors[order] = compile_vector(sym, self.symbols)
+            return self._vectors[order]
+
+
+# Process-wide LRU cache of parsed functions keyed on the normalized string
+# and the variable names
+class FunctionCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, expr, variables=("x",)):
+        key = (normalize(expr), tuple(variables))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Parse outside the lock; failures are not cached
+        entry = ParsedFunction(parse_tree(key[0], key[1]), key[1])
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def info(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+function_cache = FunctionCache(CACHE_SIZE)
+
+
+# Get the cached parsed function for an expression in the given variables
+def get_function(expr, variables=("x",)):
+    return function_cache.get(expr, variables)
+
+
+# Parse a function expression into a float64 callable
+def parse_func(expr):
+    return get_function(expr).func
+
+
+def cache_info():
+    params = parse_param.cache_info()
+    return {
+        "functions": function_cache.info(),
+        "params": {
+            "size": params.currsize,
+            "maxsize": params.maxsize,
+            "hits": params.hits,
+            "misses": params.misses,
+        },
+    }
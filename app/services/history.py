@@ -0,0 +1,119 @@
+import numpy as np
+
+modes = ("full", "every_k", "last_k", "none")
+
+
+# Iteration rows kept in a float64 buffer according to a retention mode:
+#   full     every row
+#   every_k  rows 0, k, 2k, ...
+#   last_k   the last k rows (ring buffer)
+#   none     nothing but the final row
+# The final row is always reported so summaries (iterations, final error)
+# work in every mode. Rows may contain lists or arrays (iterate vectors and
+# blocks of iterates), stored flattened.
+class History:
+    def __init__(self, mode="full", k=10):
+        if mode not in modes:
+            raise ValueError(f'Unknown history mode {mode}')
+        self.mode = mode
+        self.k = max(1, k)
+        self.count = 0
+        self.last = None
+        self._layout = None
+        self._buffer = None
+        self._size = 0
+        self._start = 0
+        self._stored = False
+
+    def _init(self, row):
+        # Shape of every entry, () for scalars
+        self._layout = [np.shape(v)
+                        if isinstance(v, (list, tuple, np.ndarray)) else ()
+                        for v in row]
+        self._flat = all(shape == () for shape in self._layout)
+        width = sum(int(np.prod(shape)) for shape in self._layout)
+        capacity = self.k if self.mode == "last_k" else 16
+        self._buffer = np.empty((capacity, width))
+
+    def _flatten(self, row):
+        if self._flat:
+            return row
+        flat = np.empty(self._buffer.shape[1])
+        i = 0
+        for v, shape in zip(row, self._layout):
+            if shape == ():
+                flat[i] = v
+                i += 1
+            else:
+                n = int(np.prod(shape))
+                flat[i:i+n] = v if len(shape) == 1 else np.ravel(v)
+                i += n
+        return flat
+
+    def _unflatten(self, flat):
+        if self._flat:
+            row = flat.tolist()
+            row[0] = int(row[0])
+            return row
+        row, i = [], 0
+        for shape in self._layout:
+            if shape == ():
+                row.append(flat[i].item())
+                i += 1
+            else:
+                n = int(np.prod(shape))
+                row.append(flat[i:i+n].reshape(shape).tolist())
+                i += n
+        row[0] = int(row[0])
+        return row
+
+    def append(self, row):
+        self.last = row
+        self.count += 1
+        self._stored = False
+        if self.mode == "none":
+            return
+        if self.mode == "every_k" and (self.count - 1) % self.k:
+            return
+        self._stored = True
+        if self._layout is None:
+            self._init(row)
+
+        if self.mode == "last_k":
+            self._buffer[(self._start + self._size) % self.k] = \
+                self._flatten(row)
+            if self._size < self.k:
+                self._size += 1
+            else:
+                self._start = (self._start + 1) % self.k
+            return
+
+        if self._size == len(self._buffer):
+            self._buffer = np.resize(
+                self._buffer, (2*len(self._buffer), self._buffer.shape[1]))
+        self._buffer[self._size] = self._flatten(row)
+        self._size += 1
+
+    def rows(self):
+        if self.count == 0:
+            return []
+        if self._layout is None:
+            self._init(self.last)
+        order = (self._start + np.arange(self._size)) % len(self._buffer)
+        rows = [self._unflatten(flat) for flat in self._buffer[order]]
+        if not self._stored:
+            rows.append(self._unflatten(np.asarray(self._flatten(self.last),
+                                                   dtype=float)))
+        return rows
+
+
+# Run a steps generator to completion, keeping its rows in a History.
+# Steps generators yield one iteration row at a time and return a dict with
+# the result (or an "error" key).
+def run_steps(steps, history=None):
+    history = History() if history is None else history
+    while True:
+        try:
+            history.append(next(steps))
+        except StopIteration as stop:
+            return history, stop.value
@@ -0,0 +1,329 @@
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+import anyio
+import numpy as np
+from decouple import config
+from services.metrics import phase
+from services.sparse import CSRMatrix
+
+# Matrices uploaded as files skip JSON entirely: the request body is written
+# to disk as it arrives and solver requests refer to it by id, so worker
+# processes memory-map it instead of receiving it pickled. Formats:
+#   npy  NumPy .npy file, kept as is when it already holds 2-D float64
+#   raw  two little-endian uint64 (rows, cols) followed by the row-major
+#        little-endian float64 entries, kept as is
+#   mtx  Matrix Market (coordinate or array, real/integer/pattern), read in
+#        chunks into CSR and stored as its .npy arrays
+# The store holds at most STORE_BYTES (uploads in progress included) and
+# drops matrices unused for TTL seconds; to make room for an upload, the
+# least recently used matrices are evicted first.
+DIRECTORY = config("MATRIX_DIR",
+                   default=os.path.join(tempfile.gettempdir(),
+                                        "veritas-matrices"))
+MAX_BYTES = config("MATRIX_MAX_BYTES", default=4*2**30, cast=int)
+STORE_BYTES = config("MATRIX_STORE_BYTES", default=4*MAX_BYTES, cast=int)
+TTL = config("MATRIX_TTL", default=24*3600, cast=float)
+# Bytes of Matrix Market lines parsed at a time
+CHUNK_BYTES = 2**22
+# Bytes of an upload buffered before they are written to disk
+WRITE_BYTES = 2**20
+RAW_HEADER = np.dtype([("rows", "<u8"), ("cols", "<u8")])
+CSR_ARRAYS = ("data", "indices", "indptr", "shape")
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+# Entries of a Matrix Market file, parsed CHUNK_BYTES of lines at a time
+# into a preallocated array
+def read_values(f, count):
+    values = np.empty(count)
+    filled = 0
+    while filled < count:
+        lines = f.readlines(CHUNK_BYTES)
+        if not lines:
+            raise ValueError("Truncated Matrix Market file")
+        chunk = np.array(b" ".join(line for line in lines
+                                   if not line.startswith(b"%")).split(),
+                         dtype=float)
+        if filled + len(chunk) > count:
+            raise ValueError("Too many Matrix Market entries")
+        values[filled:filled + len(chunk)] = chunk
+        filled += len(chunk)
+    return values
+
+
+# Matrix Market file as a CSRMatrix (coordinate) or a dense array (array)
+def read_mtx(f):
+    header = f.readline().lower().split()
+    if len(header) != 5 or header[:2] != [b"%%matrixmarket", b"matrix"]:
+        raise ValueError("Not a Matrix Market file")
+    layout, field, symmetry = header[2:]
+    if field not in (b"real", b"integer", b"pattern") or \
+            symmetry not in (b"general", b"symmetric", b"skew-symmetric") or \
+            (layout == b"array" and
+             (field == b"pattern" or symmetry != b"general")):
+        raise ValueError("Unsupported Matrix Market type")
+
+    line = f.readline()
+    while line.startswith(b"%") or (line and not line.strip()):
+        line = f.readline()
+    size = [int(v) for v in line.split()]
+
+    if layout == b"array":
+        n, m = size
+        # Entries are listed by columns
+        return read_values(f, n*m).reshape(m, n).T.copy()
+    if layout != b"coordinate":
+        raise ValueError("Unsupported Matrix Market type")
+
+    n, m, nnz = size
+    width = 2 if field == b"pattern" else 3
+    entries = read_values(f, nnz*width).reshape(nnz, width)
+    row = entries[:, 0].astype(np.int64) - 1
+    col = entries[:, 1].astype(np.int64) - 1
+    data = np.ones(nnz) if field == b"pattern" else entries[:, 2]
+    if symmetry != b"general":
+        # Only one triangle is listed; mirror the off-diagonal entries
+        off = row != col
+        sign = -1.0 if symmetry == b"skew-symmetric" else 1.0
+        row, col = np.r_[row, col[off]], np.r_[col, row[off]]
+        data = np.r_[data, sign * data[off]]
+    return CSRMatrix.from_coo(row, col, data, (n, m))
+
+
+def read_raw(path):
+    header = np.fromfile(path, dtype=RAW_HEADER, count=1)
+    if len(header) != 1:
+        raise ValueError("Missing shape header")
+    shape = int(header["rows"][0]), int(header["cols"][0])
+    if os.path.getsize(path) != RAW_HEADER.itemsize + 8*shape[0]*shape[1]:
+        raise ValueError("Buffer size does not match its shape")
+    return np.memmap(path, dtype="<f8", mode="r", offset=RAW_HEADER.itemsize,
+                     shape=shape)
+
+
+# Bytes of a stored matrix (a file, or the directory of its CSR arrays)
+def disk_size(path):
+    if os.path.isdir(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path))
+    return os.path.getsize(path)
+
+
+# Uploaded matrices on disk, one per id:
+#   <id>.npy  dense, .npy
+#   <id>.f8   dense, raw buffer with its shape header
+#   <id>/     sparse, the CSR arrays as .npy files
+# The modification time of each entry is its last use. The directory is the
+# only state, so every worker process sees the same store.
+class MatrixStore:
+    def __init__(self, directory, maxbytes, capacity=STORE_BYTES, ttl=TTL):
+        self.directory = directory
+        self.maxbytes = maxbytes
+        self.capacity = capacity
+        self.ttl = ttl
+
+    def path(self, id):
+        if not re.fullmatch(r"[0-9a-f]{32}", id):
+            raise KeyError(id)
+        return os.path.join(self.directory, id)
+
+    # Stored matrices as (last use, bytes, id), and the bytes of uploads in
+    # progress other than `upload`
+    def usage(self, upload=None):
+        entries, pending = [], 0
+        for entry in os.scandir(self.directory):
+            name, ext = os.path.splitext(entry.name)
+            try:
+                if ext == ".upload":
+                    if entry.path != upload:
+                        pending += entry.stat().st_size
+                elif re.fullmatch(r"[0-9a-f]{32}", name):
+                    entries.append((entry.stat().st_mtime,
+                                    disk_size(entry.path), name))
+            except OSError:
+                # Removed meanwhile by another process
+                pass
+        return entries, pending
+
+    # Remove expired matrices, then the least recently used ones until
+    # `needed` more bytes fit (never `keep`, and none at all if even that
+    # would not be enough); returns the free bytes
+    def make_room(self, needed=0, upload=None, keep=None):
+        entries, used = self.usage(upload)
+        used += sum(size for _, size, _ in entries)
+        kept = sum(size for _, size, id in entries if id == keep)
+        fits = used - sum(size for _, size, _ in entries) + kept + needed \
+            <= self.capacity
+        now = time.time()
+        for lastUse, size, id in sorted(entries):
+            if id == keep:
+                continue
+            if now - lastUse <= self.ttl and \
+                    (not fits or used + needed <= self.capacity):
+                break
+            try:
+                self.remove(id)
+            except (KeyError, OSError):
+                pass
+            used -= size
+        return self.capacity - used
+
+    def open_upload(self, upload):
+        os.makedirs(self.directory, exist_ok=True)
+        return open(upload, "wb")
+
+    @staticmethod
+    def discard_upload(f, upload):
+        f.close()
+        os.remove(upload)
+
+    # Write the body chunks of an upload to disk, returning its new id. The
+    # upload counts against the store's capacity: all at once when its
+    # length is known, as it grows otherwise. Only the chunks are read on
+    # the event loop; the file system work runs in threads.
+    async def receive(self, chunks, length=None):
+        if length is not None and length > self.maxbytes:
+            raise UploadTooLarge("Matrix file too large")
+        id = uuid.uuid4().hex
+        upload = self.path(id) + ".upload"
+        f = await anyio.to_thread.run_sync(self.open_upload, upload)
+        size, buffered, pending = 0, [], 0
+        try:
+            available = await anyio.to_thread.run_sync(
+                self.make_room, length or 0, upload)
+            if length is not None and length > available:
+                raise UploadTooLarge("Matrix store is full")
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > self.maxbytes:
+                    raise UploadTooLarge("Matrix file too large")
+                if size > available:
+                    available = await anyio.to_thread.run_sync(
+                        self.make_room, size, upload)
+                    if size > available:
+                        raise UploadTooLarge("Matrix store is full")
+                buffered.append(chunk)
+                pending += len(chunk)
+                if pending >= WRITE_BYTES:
+                    await anyio.to_thread.run_sync(f.writelines, buffered)
+                    buffered, pending = [], 0
+            await anyio.to_thread.run_sync(f.writelines, buffered)
+            await anyio.to_thread.run_sync(f.close)
+        except BaseException:
+            # Also when the request is cancelled
+            with anyio.CancelScope(shield=True):
+                await anyio.to_thread.run_sync(self.discard_upload, f, upload)
+            raise
+        return id
+
+    # Turn a received upload into a stored matrix
+    def ingest(self, id, format):
+        base = self.path(id)
+        upload = base + ".upload"
+        try:
+            if format == "npy":
+                A = np.load(upload, mmap_mode="r")
+                if A.ndim != 2 or A.dtype.kind not in "biuf":
+                    raise ValueError("A must be a 2-D real array")
+                if A.dtype == np.dtype("<f8"):
+                    os.replace(upload, base + ".npy")
+                else:
+                    np.save(base + ".npy", np.asarray(A, dtype="<f8"))
+            elif format == "raw":
+                read_raw(upload)
+                os.replace(upload, base + ".f8")
+            elif format == "mtx":
+                with open(upload, "rb") as f:
+                    A = read_mtx(f)
+                if isinstance(A, CSRMatrix):
+                    os.makedirs(base)
+                    for name, array in zip(CSR_ARRAYS, (
+                            A.data, A.indices, A.indptr, A.shape)):
+                        np.save(os.path.join(base, name + ".npy"), array)
+                else:
+                    np.save(base + ".npy", A)
+            else:
+                raise ValueError(f'Unknown matrix format {format}')
+        finally:
+            if os.path.exists(upload):
+                os.remove(upload)
+        # The stored form can be larger than the upload (e.g. integer .npy)
+        self.make_room(0, keep=id)
+        return self.load(id)
+
+    # Memory-mapped matrix: an ndarray (dense) or a CSRMatrix (sparse).
+    # Loading renews its last use; expired matrices are removed instead.
+    def load(self, id):
+        base = self.path(id)
+        for path in (base + ".npy", base + ".f8", base):
+            if os.path.exists(path):
+                break
+        else:
+            raise KeyError(id)
+        if time.time() - os.path.getmtime(path) > self.ttl:
+            self.remove(id)
+            raise KeyError(id)
+        os.utime(path)
+        if path == base:
+            data, indices, indptr, shape = (
+                np.load(os.path.join(base, name + ".npy"), mmap_mode="r")
+                for name in CSR_ARRAYS)
+            return CSRMatrix(data, indices, indptr, tuple(shape.tolist()))
+        if path.endswith(".f8"):
+            return read_raw(path)
+        return np.load(path, mmap_mode="r")
+
+    def remove(self, id):
+        base = self.path(id)
+        for path in (base + ".npy", base + ".f8"):
+            if os.path.exists(path):
+                os.remove(path)
+                return
+        if os.path.isdir(base):
+            shutil.rmtree(base)
+            return
+        raise KeyError(id)
+
+
+matrix_store = MatrixStore(DIRECTORY, MAX_BYTES)
+
+
+# Stored matrices ({"format": "stored", "id": ...}) are memory-mapped from
+# the store; any other input is returned unchanged
+def resolve(A):
+    if isinstance(A, dict) and A.get("format") == "stored":
+        with phase("parse"):
+            return matrix_store.load(A["id"])
+    return A
+
+
+def describe(id, A):
+    return {
+        "id": id,
+        "shape": list(A.shape),
+        "sparse": isinstance(A, CSRMatrix),
+        "nnz": A.nnz if isinstance(A, CSRMatrix) else None,
+    }
+
+
+def Store(id: str, format: str) -> (dict, str):
+    try:
+        with phase("parse"):
+            A = matrix_store.ingest(id, format)
+    except (ValueError, KeyError, OSError):
+        return None, "Invalid matrix file"
+    return describe(id, A), None
+
+
+def Remove(id: str) -> (dict, str):
+    try:
+        matrix_store.remove(id)
+    except KeyError:
+        return None, "Unknown matrix id"
+    return {"id": id}, None
@@ -1,4 +1,5 @@
 import sympy as sy
+from services.budget import charge
 
 
 def ordinal(n):
@@ -10,6 +11,28 @@ def has_duplicates(list):
     return len(list) != len(set(list))
 
 
+# Solve A x = b by Gauss-Jordan elimination. Each eliminated column is
+# charged as one evaluation, so a compare_all budget can stop the solve
+# between columns.
+def solve(A, b):
+    n = A.rows
+    M = A.row_join(b)
+    for k in range(n):
+        charge()
+        p = next((i for i in range(k, n) if M[i, k] != 0), None)
+        if p is None:
+            raise ValueError("Matrix is singular")
+        if p != k:
+            M.row_swap(k, p)
+        pivot = M[k, k]
+        M.row_op(k, lambda v, _: v / pivot)
+        for i in range(n):
+            factor = M[i, k]
+            if i != k and factor != 0:
+                M.row_op(i, lambda v, j: v - factor*M[k, j])
+    return M[:, n]
+
+
 def order_together(x, y):
     combined = list(zip(x, y))
     combined.sort()
@@ -28,11 +51,12 @@ def Vandermonde(x: list, y: list) -> (list, list, str, str):
     # Vandermond matrix
     A = sy.zeros(degree)
     for i in range(degree):
+        charge()
         for j in range(degree):
             A[i, j] = x[i] ** j
 
     # Solve the system
-    a = A.inv() * sy.Matrix(y)
+    a = solve(A, sy.Matrix(y))
 
     # Get the polynomial
     p = ""
@@ -61,6 +85,7 @@ def Newton(x, y) -> (dict, str, str):
     dd = sy.zeros(degree)
     b = []
     for i in range(degree):
+        charge()
         for j in range(degree):
             if j == 0:
                 dd[i, j] = y[i]
@@ -125,6 +150,7 @@ def Lagrange(x: list, y: list) -> (str, str, str):
     polynomial = ''
     texPolynomial = ''
     for i in range(degree):
+        charge()
         coef, texCoef = L_k(x, i)
         if i != 0:
             polynomial += ' + '
@@ -160,7 +186,7 @@ def LinearSpline(x: list, y: list) -> (list, list, str):
         c += 2
         h += 1
 
-    val = A.inv() * b
+    val = solve(A, b)
     val = val.reshape(n-1, 2).tolist()
     val = [[float(x) for x in row] for row in val]
 
@@ -232,7 +258,7 @@ def CubicSpline(x: list, y: list) -> (list, list, str):
     A[h, c+1] = 2
     b[h] = 0
 
-    val = A.inv() * b
+    val = solve(A, b)
     val = val.reshape(n-1, 4).tolist()
     val = [[float(x) for x in row] for row in val]
 
@@ -0,0 +1,335 @@
+import numpy as np
+from services.budget import charge
+from services.convergence import with_rhs
+from services.direct import Factorization, SingularMatrix, symmetric
+from services.history import History, run_steps
+from services.ingest import resolve
+from services.metrics import phase
+from services.sparse import CSRMatrix, Sweeps, from_input
+
+# Krylov solvers: CG (symmetric positive definite A), BiCGSTAB and
+# restarted GMRES, on dense or sparse A, with optional Jacobi or ILU(0)
+# preconditioning. The error column is the 2-norm of the residual b - A x
+# (divided by ||b|| for relative errors). For symmetric A, ILU(0) is the
+# incomplete Cholesky factorization IC(0), M = L D L^T, which CG can use
+# when the pivots D are positive.
+columns = ["n", "x", "error"]
+RESTART = 30
+
+
+# Jacobi preconditioner: M = D
+class JacobiPreconditioner:
+    def __init__(self, d):
+        if (d == 0).any():
+            raise SingularMatrix("A contains zeros in its diagonal")
+        self.d = d
+
+    def apply(self, r):
+        return r / self.d
+
+
+# Incomplete LU without fill-in: L U matches A on its sparsity pattern.
+# The triangular solves are single Gauss-Seidel sweeps (from x = 0 a
+# forward sweep over a lower triangular matrix is forward substitution), so
+# they share the level scheduling of the sparse sweeps; U is solved as the
+# lower triangular matrix of the reversed ordering.
+class ILU0:
+    def __init__(self, A: CSRMatrix):
+        n = self.n = A.shape[0]
+        # Entries sorted by column within every row
+        order = np.lexsort((A.indices, A.rows))
+        rows, cols = A.rows[order], A.indices[order]
+        indptr, indices = A.indptr.tolist(), cols.tolist()
+        data = A.data[order].tolist()
+
+        diag = [0] * n
+        for i in range(n):
+            row = {indices[p]: p for p in range(indptr[i], indptr[i+1])}
+            if i not in row:
+                raise SingularMatrix("ILU(0) needs every diagonal entry")
+            diag[i] = row[i]
+            for p in range(indptr[i], diag[i]):
+                k = indices[p]
+                if data[diag[k]] == 0:
+                    raise SingularMatrix("Zero pivot in ILU(0)")
+                data[p] /= data[diag[k]]
+                for q in range(diag[k] + 1, indptr[k+1]):
+                    t = row.get(indices[q])
+                    if t is not None:
+                        data[t] -= data[p] * data[q]
+        if any(data[p] == 0 for p in diag):
+            raise SingularMatrix("Zero pivot in ILU(0)")
+
+        data = np.array(data)
+        self.pivots = data[diag]
+        lower, upper = cols < rows, cols >= rows
+        L = CSRMatrix.from_coo(np.r_[rows[lower], np.arange(n)],
+                               np.r_[cols[lower], np.arange(n)],
+                               np.r_[data[lower], np.ones(n)], (n, n))
+        U = CSRMatrix.from_coo(n - 1 - rows[upper], n - 1 - cols[upper],
+                               data[upper], (n, n))
+        self.lower, self.upper = Sweeps(L, np.zeros(n)), \
+            Sweeps(U, np.zeros(n))
+        self.lower.levels()
+        self.upper.levels()
+
+    def apply(self, r):
+        y = with_rhs(self.lower, r).sor(np.zeros(self.n))
+        z = with_rhs(self.upper, y[::-1].copy()).sor(np.zeros(self.n))
+        return z[::-1]
+
+
+# ILU(0) of dense A on the pattern of its nonzeros: right-looking
+# elimination without pivoting whose updates are dropped outside the
+# pattern, packed like the direct LU (unit lower triangle implied). A with
+# no zeros gets the complete LU.
+def ilu0_factor(A):
+    A = np.array(A, dtype=float)
+    pattern = A != 0
+    for k in range(len(A)):
+        if A[k, k] == 0:
+            raise SingularMatrix("Zero pivot in ILU(0)")
+        rows = k + 1 + np.flatnonzero(pattern[k+1:, k])
+        if rows.size == 0:
+            continue
+        A[rows, k] /= A[k, k]
+        cols = k + 1 + np.flatnonzero(pattern[k, k+1:])
+        # Contiguous trailing block (dense rows and columns) as a view
+        if len(rows) == len(cols) == len(A) - k - 1:
+            block = np.s_[k+1:, k+1:]
+        else:
+            block = np.ix_(rows, cols)
+        update = np.outer(A[rows, k], A[k, cols])
+        update[~pattern[block]] = 0.0
+        A[block] -= update
+    return A
+
+
+# Dense ILU(0); the triangular solves are the blocked ones of the direct
+# solver
+class DenseILU0:
+    def __init__(self, A):
+        factor = ilu0_factor(A)
+        self.pivots = np.diag(factor).copy()
+        self.factorization = Factorization("lu", factor, np.arange(len(A)))
+
+    def apply(self, r):
+        return self.factorization.solve(r)
+
+
+# Whether CSR A equals its transpose (duplicates summed)
+def csr_symmetric(A):
+    B = CSRMatrix.from_coo(A.rows, A.indices, A.data, A.shape)
+    T = CSRMatrix.from_coo(A.indices, A.rows, A.data, A.shape)
+    return np.array_equal(B.indptr, T.indptr) and \
+        np.array_equal(B.indices, T.indices) and \
+        np.abs(B.data - T.data).max(initial=0) <= \
+        1e-12 * np.abs(B.data).max(initial=0)
+
+
+# Preconditioner of the given kind; spd asks for a symmetric positive
+# definite one (CG)
+def make_preconditioner(A, kind, spd=False):
+    if kind == "none":
+        return None
+    if kind == "jacobi":
+        d = A.diagonal() if isinstance(A, CSRMatrix) else np.diag(A).copy()
+        return JacobiPreconditioner(d)
+    if kind == "ilu0":
+        sparse = isinstance(A, CSRMatrix)
+        if spd and not (csr_symmetric(A) if sparse else symmetric(A)):
+            raise SingularMatrix("CG with ILU(0) needs a symmetric A")
+        M = ILU0(A) if sparse else DenseILU0(A)
+        if spd and not (M.pivots > 0).all():
+            raise SingularMatrix("ILU(0) of A is not positive definite; "
+                                 "use jacobi with CG")
+        return M
+    raise ValueError(f'Unknown preconditioner {kind}')
+
+
+def operator(A):
+    return A.matvec if isinstance(A, CSRMatrix) else A.__matmul__
+
+
+def cg(matvec, M, b, x, tol, niter, scale):
+    r = b - matvec(x)
+    z = r if M is None else M.apply(r)
+    p = z.copy()
+    rz = r @ z
+    n = 0
+    err = np.linalg.norm(r) / scale
+    yield [n, x, float(err)]
+    while err > tol and n < niter:
+        charge()
+        Ap = matvec(p)
+        pAp = p @ Ap
+        if not pAp > 0:
+            return {"error": "A is not symmetric positive definite"}
+        alpha = rz / pAp
+        x = x + alpha*p
+        r = r - alpha*Ap
+        err = np.linalg.norm(r) / scale
+        n += 1
+        yield [n, x, float(err)]
+        z = r if M is None else M.apply(r)
+        rzNew = r @ z
+        p = z + (rzNew / rz)*p
+        rz = rzNew
+    return {"x": x, "n": n, "err": err}
+
+
+def bicgstab(matvec, M, b, x, tol, niter, scale):
+    r = b - matvec(x)
+    rHat = r.copy()
+    rho = alpha = omega = 1.0
+    v = p = np.zeros_like(b)
+    n = 0
+    err = np.linalg.norm(r) / scale
+    yield [n, x, float(err)]
+    while err > tol and n < niter:
+        rhoNew = rHat @ r
+        if rhoNew == 0 or omega == 0:
+            return {"error": "BiCGSTAB broke down"}
+        p = r + (rhoNew / rho) * (alpha / omega) * (p - omega*v)
+        pHat = p if M is None else M.apply(p)
+        charge()
+        v = matvec(pHat)
+        if rHat @ v == 0:
+            return {"error": "BiCGSTAB broke down"}
+        alpha = rhoNew / (rHat @ v)
+        s = r - alpha*v
+        n += 1
+        if np.linalg.norm(s) / scale <= tol:
+            x = x + alpha*pHat
+            r = s
+        else:
+            sHat = s if M is None else M.apply(s)
+            charge()
+            t = matvec(sHat)
+            omega = (t @ s) / (t @ t) if t @ t > 0 else 0.0
+            x = x + alpha*pHat + omega*sHat
+            r = s - omega*t
+        rho = rhoNew
+        err = np.linalg.norm(r) / scale
+        yield [n, x, float(err)]
+    return {"x": x, "n": n, "err": err}
+
+
+# GMRES(restart) with right preconditioning, so the Givens-updated
+# residual is the one of the unpreconditioned system
+def gmres(matvec, M, b, x, tol, niter, scale, restart=RESTART):
+    m = max(1, min(restart, len(b)))
+    r = b - matvec(x)
+    n = 0
+    err = np.linalg.norm(r) / scale
+    yield [n, x, float(err)]
+    while err > tol and n < niter:
+        beta = np.linalg.norm(r)
+        V = np.zeros((m + 1, len(b)))
+        Z = np.zeros((m, len(b)))
+        H = np.zeros((m + 1, m))
+        cs, sn = np.zeros(m), np.zeros(m)
+        g = np.zeros(m + 1)
+        V[0], g[0] = r / beta, beta
+        for j in range(m):
+            charge()
+            Z[j] = V[j] if M is None else M.apply(V[j])
+            w = matvec(Z[j])
+            # Modified Gram-Schmidt
+            for i in range(j + 1):
+                H[i, j] = w @ V[i]
+                w = w - H[i, j]*V[i]
+            H[j+1, j] = np.linalg.norm(w)
+            for i in range(j):
+                H[i, j], H[i+1, j] = cs[i]*H[i, j] + sn[i]*H[i+1, j], \
+                    -sn[i]*H[i, j] + cs[i]*H[i+1, j]
+            denom = np.hypot(H[j, j], H[j+1, j])
+            cs[j], sn[j] = H[j, j] / denom, H[j+1, j] / denom
+            H[j, j], H[j+1, j] = denom, 0.0
+            g[j], g[j+1] = cs[j]*g[j], -sn[j]*g[j]
+            y = np.linalg.solve(np.triu(H[:j+1, :j+1]), g[:j+1])
+            xj = x + y @ Z[:j+1]
+            n += 1
+            err = abs(g[j+1]) / scale
+            yield [n, xj, float(err)]
+            lucky = np.linalg.norm(w) == 0
+            if err <= tol or lucky or n >= niter:
+                break
+            V[j+1] = w / np.linalg.norm(w)
+        x = xj
+        r = b - matvec(x)
+        err = np.linalg.norm(r) / scale
+    return {"x": x, "n": n, "err": err}
+
+
+solvers = {
+    "cg": cg,
+    "bicgstab": bicgstab,
+    "gmres": gmres,
+}
+
+
+def krylov_steps(A, b, x0, tol, niter, method, relativeError,
+                 preconditioner="none", restart=RESTART):
+    try:
+        A = resolve(A)
+    except KeyError:
+        return {"error": "Unknown matrix id"}
+    try:
+        with phase("parse"):
+            A = from_input(A) if isinstance(A, (dict, CSRMatrix)) else \
+                np.asarray(A, dtype=float)
+            b = np.asarray(b, dtype=float).ravel()
+            x0 = np.asarray(x0, dtype=float).ravel()
+        if len(A.shape) != 2 or A.shape[0] != A.shape[1] or \
+                len(b) != A.shape[0] or len(x0) != A.shape[0]:
+            return {"error": "Invalid dimensions"}
+        solver = solvers[method]
+    except Exception:
+        return {"error": "Error in the input"}
+
+    try:
+        with phase("setup"):
+            M = make_preconditioner(A, preconditioner, method == "cg")
+    except SingularMatrix as e:
+        return {"error": str(e)}
+
+    scale = 1.0
+    if relativeError:
+        scale = float(np.linalg.norm(b)) or 1.0
+    args = (operator(A), M, b, x0, tol, niter, scale)
+    if method == "gmres":
+        args += (restart,)
+    result = yield from solver(*args)
+    if "error" in result:
+        return result
+    if not result["err"] <= tol:
+        return {"error": f'Method failed in {result["n"]} iterations'}
+
+    x = result["x"]
+    return {
+        "x": x.tolist(),
+        "residual": float(np.linalg.norm(b - operator(A)(x))),
+    }
+
+
+def Krylov_methods(
+        A: list | dict,
+        b: list,
+        x0: list,
+        tol: float,
+        niter: int,
+        method: str,
+        relativeError: bool,
+        preconditioner: str = "none",
+        restart: int = RESTART,
+        history: str = "full",
+        historyK: int = 10) -> (dict, str):
+    steps = krylov_steps(A, b, x0, tol, niter, method, relativeError,
+                         preconditioner, restart)
+    history, result = run_steps(steps, History(history, historyK))
+    if "error" in result:
+        return None, result["error"]
+
+    data = dict(result, columns=columns, rows=history.rows())
+    return data, None
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from decouple import config
+
+# Peak memory of a run is measured by default from the kernel's resident set
+# high-water mark (VmHWM), reset before the run; this costs two small /proc
+# reads and a write per run. METRICS_MEMORY switches to tracemalloc, which
+# counts Python allocations exactly but slows down every allocation in the
+# process. Both are process-wide: a worker process runs one method at a time,
+# but with concurrent runs in threads the figure is approximate. Without
+# /proc (and without tracemalloc) peakMemory is left out of the report.
+TRACK_MEMORY = config("METRICS_MEMORY", default=False, cast=bool)
+PROC_STATUS = "/proc/self/status"
+PROC_CLEAR_REFS = "/proc/self/clear_refs"
+
+_local = threading.local()
+
+
+# Cost of a single method run: function evaluations, time per phase and
+# peak allocation
+class Metrics:
+    def __init__(self):
+        self.evaluations = 0
+        self.phases = {}
+        self.time = 0.0
+        self.peakMemory = None
+
+    def report(self):
+        phases = dict(self.phases)
+        phases["iterate"] = max(self.time - sum(phases.values()), 0.0)
+        report = {
+            "evaluations": self.evaluations,
+            "time": self.time,
+            "phases": phases,
+        }
+        if self.peakMemory is not None:
+            report["peakMemory"] = self.peakMemory
+        return report
+
+
+# Resident set size and its high-water mark in bytes, from /proc
+def resident_memory():
+    values = {}
+    with open(PROC_STATUS, "rb") as f:
+        for line in f:
+            if line.startswith((b"VmRSS:", b"VmHWM:")):
+                values[line[:5]] = int(line.split()[1]) * 1024
+    return values[b"VmRSS"], values[b"VmHWM"]
+
+
+# Reset the high-water mark to the current resident set size; returns the
+# latter, or None when the kernel interface is not available
+def reset_peak_resident():
+    try:
+        with open(PROC_CLEAR_REFS, "w") as f:
+            f.write("5")
+        return resident_memory()[0]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def current():
+    return getattr(_local, "metrics", None)
+
+
+# Count function evaluations on the metrics of the current thread (if any)
+def count(n=1):
+    metrics = getattr(_local, "metrics", None)
+    if metrics is not None:
+        metrics.evaluations += n
+
+
+# Time a phase (parse, compile, setup, ...); the rest of a run is "iterate"
+@contextmanager
+def phase(name):
+    metrics = getattr(_local, "metrics", None)
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.phases[name] = metrics.phases.get(name, 0.0) + \
+            time.perf_counter() - start
+
+
+# Run fn with fresh metrics bound to this thread; returns (result, report)
+def measure(fn):
+    metrics, previous = Metrics(), current()
+    _local.metrics = metrics
+    if TRACK_MEMORY:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    else:
+        baseline = reset_peak_resident()
+    start = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        metrics.time = time.perf_counter() - start
+        if TRACK_MEMORY:
+            metrics.peakMemory = max(
+                tracemalloc.get_traced_memory()[1] - baseline, 0)
+        elif baseline is not None:
+            metrics.peakMemory = max(resident_memory()[1] - baseline, 0)
+        _local.metrics = previous
+    return result, metrics.report()
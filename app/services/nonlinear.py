@@ -1,25 +1,10 @@
-import sympy as sy
-import sympy.parsing.sympy_parser as spp
+from services.expressions import evaluate, evaluate_all, parse_param, parse_func, \
+    get_function, evaluate_precise, cancels
+from services.history import History, run_steps
 
-transforms = spp.standard_transformations + \
-    (spp.implicit_multiplication_application,)
-
-
-# Evaluate the expression at a given point
-def evaluate(expr, x):
-    return float(expr.evalf(subs={sy.symbols("x"): x}))
-
-
-# Parse a numeric parameter
-def parse_param(expr):
-    expr = expr.replace("^", "**")
-    return float(spp.parse_expr(expr, transformations=transforms).evalf())
-
-
-# Parse a function expression
-def parse_func(expr):
-    expr = expr.replace("^", "**")
-    return spp.parse_expr(expr, transformations=transforms, evaluate=False)
+bracketColumns = ["n", "a", "xm", "b", "f(xm)", "error"]
+openColumns = ["n", "x", "f(x)", "error"]
+acceleratedColumns = ["n", "raw", "x", "f(x)", "error"]
 
 
 # Calculate the error
@@ -29,255 +14,531 @@ def error(x1, x0, relative):
     return abs(x1-x0)
 
 
-def Bisection(
-        a: str,
-        b: str,
-        fx: str,
-        tol: float,
-        niter: int,
-        relativeError: bool) -> (float, dict, str):
+# Root of the secant line through (x0, f0) and (x1, f1). When f1 - f0
+# cancels, both values are recomputed with mpmath. Returns (x, escalated);
+# x is None when the line is flat.
+def secant_point(function, x0, x1, f0, f1):
+    if not cancels(f1, f0):
+        return x1 - f1*(x1-x0)/(f1-f0), False
+    precise = function.precise(0)
+    f0, f1 = evaluate_precise(precise, x0)[0], evaluate_precise(precise, x1)[0]
+    if f1 == f0:
+        return None, True
+    return float(x1 - f1*(x1-x0)/(f1-f0)), True
+
+
+# Run a steps generator to completion and build its iteration table. The
+# result holds either "root" (plus extra table fields) or "error".
+def tabulate(steps, columns, history, historyK) -> (float, dict, str):
+    history, result = run_steps(steps, History(history, historyK))
+    if "error" in result:
+        return 0, None, result["error"]
+    if history.count == 0:
+        return result["root"], None, None
+
+    table = {"columns": columns, "rows": history.rows()}
+    table.update({k: v for k, v in result.items() if k != "root"})
+    return result["root"], table, None
+
+
+def bisection_steps(a, b, fx, tol, niter, relativeError):
     try:
         a, b = parse_param(a), parse_param(b)
         fxExp = parse_func(fx)
         if b < a:
-            return 0, None, "a must be less than b"
+            return {"error": "a must be less than b"}
     except Exception:
-        return 0, None, "Invalid function or interval"
+        return {"error": "Invalid function or interval"}
 
-    n = 0
-    an, bn, E = [a], [b], [100]
     fa, fb = evaluate(fxExp, a), evaluate(fxExp, b)
-    xm = [(an[n] + bn[n]) / 2]
-    fm = [evaluate(fxExp, xm[n])]
 
     if fa == 0:
-        return a, None, None
+        return {"root": a}
     elif fb == 0:
-        return b, None, None
+        return {"root": b}
     elif fa*fb >= 0:
-        err = f'[{a}, {b}] is not a valid interval'
-        return 0, None, err
-
-    while E[n] > tol and n < niter:
-        if fm[n] == 0:
-            return xm[n], None, None
-        elif fa*fm[n] > 0:
-            an.append(xm[n])
-            bn.append(bn[n])
-            fa = fm[n]
+        return {"error": f'[{a}, {b}] is not a valid interval'}
+
+    n, E = 0, 100
+    xm = (a + b) / 2
+    fm = evaluate(fxExp, xm)
+    yield [n, a, xm, b, fm, E]
+
+    while E > tol and n < niter:
+        if fm == 0:
+            return {"root": xm}
+        elif fa*fm > 0:
+            a, fa = xm, fm
         else:
-            an.append(an[n])
-            bn.append(xm[n])
+            b = xm
         n += 1
-        xm.append((an[n]+bn[n])/2)
-        fm.append(evaluate(fxExp, xm[n]))
-        E.append(error(xm[n-1], xm[n], relativeError))
-
-    if n == niter or not (E[n] < tol):
-        err = f'Method failed in {niter} iterations'
-        return 0, None, err
-
-    table = {
-        "columns": ["n", "a", "xm", "b", "f(xm)", "error"],
-        "rows": [[i, an[i], xm[i], bn[i], fm[i], E[i]] for i in range(n+1)],
-    }
+        xp, xm = xm, (a+b)/2
+        fm = evaluate(fxExp, xm)
+        E = error(xp, xm, relativeError)
+        yield [n, a, xm, b, fm, E]
 
-    return xm[n], table, None
+    if n == niter or not (E < tol):
+        return {"error": f'Method failed in {niter} iterations'}
+    return {"root": xm}
 
 
-def Fixed_point(
-        x0: str,
+def Bisection(
+        a: str,
+        b: str,
         fx: str,
-        gx: str,
         tol: float,
         niter: int,
-        relativeError: bool) -> (float, dict, str):
+        relativeError: bool,
+        history: str = "full",
+        historyK: int = 10) -> (float, dict, str):
+    steps = bisection_steps(a, b, fx, tol, niter, relativeError)
+    return tabulate(steps, bracketColumns, history, historyK)
+
+
+def fixed_point_steps(x0, fx, gx, tol, niter, relativeError,
+                      acceleration="none"):
     try:
         x0 = parse_param(x0)
         fxExp = parse_func(fx)
         gxExp = parse_func(gx)
     except Exception:
-        return 0, None, "Invalid function or initial value"
-
-    x, n = x0, 0
-    xn, fn, E = [x], [evaluate(fxExp, x)], [100]
-
-    while E[n] > tol and n < niter:
-        x = evaluate(gxExp, x)
-        if fn[n] == 0:
-            return x, None, None
+        return {"error": "Invalid function or initial value"}
+
+    if acceleration == "aitken":
+        return (yield from aitken_steps(x0, fxExp, gxExp, tol, niter,
+                                        relativeError))
+    elif acceleration == "steffensen":
+        return (yield from steffensen_steps(x0, fxExp, gxExp, tol, niter,
+                                            relativeError))
+    elif acceleration != "none":
+        return {"error": f'Unknown acceleration {acceleration}'}
+
+    x, n, E = x0, 0, 100
+    fn = evaluate(fxExp, x)
+    evaluations = 1
+    yield [n, x, fn, E]
+
+    while E > tol and n < niter:
+        xp, x = x, evaluate(gxExp, x)
+        evaluations += 1
+        if fn == 0:
+            return {"root": x, "evaluations": evaluations}
 
         n += 1
-        xn.append(x)
-        fn.append(evaluate(fxExp, x))
-        E.append(error(xn[n], xn[n-1], relativeError))
+        fn = evaluate(fxExp, x)
+        evaluations += 1
+        E = error(x, xp, relativeError)
+        yield [n, x, fn, E]
+
+    if n >= niter or not (E < tol):
+        return {"error": f'Method failed in {niter} iterations'}
+    return {"root": x, "evaluations": evaluations}
+
+
+# Aitken's delta-squared extrapolation of the plain g(x) iterates: each new
+# raw iterate yields one accelerated iterate
+def aitken_steps(x0, fxExp, gxExp, tol, niter, relativeError):
+    x, n, E = x0, 0, 100
+    fn = evaluate(fxExp, x)
+    evaluations = 1
+    yield [n, x, x, fn, E]
+
+    raw = [x0, evaluate(gxExp, x0)]
+    evaluations += 1
+    while E > tol and n < niter:
+        if fn == 0:
+            return {"root": x, "evaluations": evaluations}
+
+        raw = [raw[-2], raw[-1], evaluate(gxExp, raw[-1])]
+        evaluations += 1
+        d = raw[2] - 2*raw[1] + raw[0]
+
+        xp = x
+        x = raw[2] if d == 0 else raw[0] - (raw[1] - raw[0])**2/d
+        n += 1
+        fn = evaluate(fxExp, x)
+        evaluations += 1
+        E = error(x, xp, relativeError)
+        yield [n, raw[2], x, fn, E]
+
+    if n >= niter or not (E < tol):
+        return {"error": f'Method failed in {niter} iterations'}
+    return {"root": x, "evaluations": evaluations}
+
+
+# Steffensen's method: restart the g(x) iteration from every Aitken
+# extrapolation, converging quadratically without derivatives
+def steffensen_steps(x0, fxExp, gxExp, tol, niter, relativeError):
+    x, n, E = x0, 0, 100
+    fn = evaluate(fxExp, x)
+    evaluations = 1
+    yield [n, x, x, fn, E]
+
+    while E > tol and n < niter:
+        if fn == 0:
+            return {"root": x, "evaluations": evaluations}
+
+        y = evaluate(gxExp, x)
+        z = evaluate(gxExp, y)
+        evaluations += 2
+        d = z - 2*y + x
+
+        xp = x
+        x = z if d == 0 else x - (y - x)**2/d
+        n += 1
+        fn = evaluate(fxExp, x)
+        evaluations += 1
+        E = error(x, xp, relativeError)
+        yield [n, z, x, fn, E]
 
-    if n >= niter or not (E[n] < tol):
-        err = f'Method failed in {niter} iterations'
-        return 0, None, err
+    if n >= niter or not (E < tol):
+        return {"error": f'Method failed in {niter} iterations'}
+    return {"root": x, "evaluations": evaluations}
 
-    table = {
-        "columns": ["n", "x", "f(x)", "error"],
-        "rows": [[i, xn[i], fn[i], E[i]] for i in range(n+1)],
-    }
-    return x, table, None
 
+# Accelerated tables keep the last raw g(x) iterate next to the extrapolated x
+def fixed_point_columns(acceleration):
+    return openColumns if acceleration == "none" else acceleratedColumns
 
-def False_position(
-        a: str,
-        b: str,
+
+def Fixed_point(
+        x0: str,
         fx: str,
+        gx: str,
         tol: float,
         niter: int,
-        relativeError: bool) -> (float, dict, str):
+        relativeError: bool,
+        acceleration: str = "none",
+        history: str = "full",
+        historyK: int = 10) -> (float, dict, str):
+    steps = fixed_point_steps(x0, fx, gx, tol, niter, relativeError,
+                              acceleration)
+    return tabulate(steps, fixed_point_columns(acceleration), history,
+                    historyK)
+
+
+def false_position_steps(a, b, fx, tol, niter, relativeError):
     try:
         a, b = parse_param(a), parse_param(b)
-        fxExp = parse_func(fx)
+        function = get_function(fx)
+        fxExp = function.func
         if b < a:
-            return 0, None, "a must be less than b"
+            return {"error": "a must be less than b"}
     except Exception:
-        return 0, None, "Invalid function or interval"
+        return {"error": "Invalid function or interval"}
 
-    n = 0
-    an, bn, E = [a], [b], [100]
     fa, fb = evaluate(fxExp, a), evaluate(fxExp, b)
-    xm = [bn[n] - fb*(bn[n]-an[n])/(fb-fa)]
-    fm = [evaluate(fxExp, xm[n])]
 
     if fa == 0:
-        return a, None, None
+        return {"root": a}
     elif fb == 0:
-        return b, None, None
+        return {"root": b}
     elif fa*fb >= 0:
-        err = f'[{a}, {b}] is not a valid interval'
-        return 0, None, err
-
-    while E[n] > tol and n <= niter:
-        if fm[n]*fb < 0:
-            an.append(xm[n])
-            bn.append(bn[n])
-            fa = fm[n]
+        return {"error": f'[{a}, {b}] is not a valid interval'}
+
+    n, E, escalated = 0, 100, []
+    xm, precise = secant_point(function, a, b, fa, fb)
+    if precise:
+        escalated.append(n)
+    fm = evaluate(fxExp, xm)
+    yield [n, a, xm, b, fm, E]
+
+    while E > tol and n <= niter:
+        if fm*fb < 0:
+            a, fa = xm, fm
         else:
-            bn.append(xm[n])
-            an.append(an[n])
-            fb = fm[n]
+            b, fb = xm, fm
         n += 1
-        xm.append(bn[n] - fb*(bn[n]-an[n])/(fb-fa))
-        fm.append(evaluate(fxExp, xm[n]))
-        E.append(error(xm[n], xm[n-1], relativeError))
-
-    if n == niter or not (E[n] < tol):
-        err = f'Method failed in {niter} iterations'
-        return 0, None, err
+        xp, (xm, precise) = xm, secant_point(function, a, b, fa, fb)
+        if xm is None:
+            return {"error": "Division by zero"}
+        if precise:
+            escalated.append(n)
+        fm = evaluate(fxExp, xm)
+        E = error(xm, xp, relativeError)
+        yield [n, a, xm, b, fm, E]
 
-    table = {
-        "columns": ["n", "a", "xm", "b", "f(xm)", "error"],
-        "rows": [[i, an[i], xm[i], bn[i], fm[i], E[i]] for i in range(n+1)],
-    }
-    return xm[n], table, None
+    if n == niter or not (E < tol):
+        return {"error": f'Method failed in {niter} iterations'}
+    return {"root": xm, "escalated": escalated}
 
 
-def Newton(
-        x0: str,
+def False_position(
+        a: str,
+        b: str,
         fx: str,
         tol: float,
         niter: int,
-        multiple_roots: bool,
-        relativeError: bool) -> (float, dict, str):
+        relativeError: bool,
+        history: str = "full",
+        historyK: int = 10) -> (float, dict, str):
+    steps = false_position_steps(a, b, fx, tol, niter, relativeError)
+    return tabulate(steps, bracketColumns, history, historyK)
+
+
+def newton_steps(x0, fx, tol, niter, multiple_roots, relativeError):
     try:
         x0 = parse_param(x0)
-        fxExp = parse_func(fx)
-        fdExp = sy.diff(fxExp, sy.symbols("x"))
-        fddExp = sy.diff(fdExp, sy.symbols("x"))
+        # One kernel returns f, f' (and f'' for multiple roots)
+        function = get_function(fx)
+        kernel = function.fused(2 if multiple_roots else 1)
     except Exception:
-        return 0, None, "Invalid function or interval"
+        return {"error": "Invalid function or interval"}
 
-    n = 0
-    xn, fn, E = [x0], [evaluate(fxExp, x0)], [100]
+    x, n, E, escalated = x0, 0, 100, []
+    values = evaluate_all(kernel, x)
+    fn = values[0]
 
-    if fn[n] == 0:
-        return xn[n], None, None
+    if fn == 0:
+        return {"root": x, "escalated": escalated}
+    yield [n, x, fn, E]
 
-    while E[n] > tol and n < niter:
-        # Evaluate the function and its derivatives
-        fdx = evaluate(fdExp, xn[n])
+    while E > tol and n < niter:
+        # The function and its derivatives at x come from the last evaluation
+        fx, fdx = values[0], values[1]
         if multiple_roots:
-            fddx = evaluate(fddExp, xn[n])
-        fx = evaluate(fxExp, xn[n])
+            fddx = values[2]
 
         if fdx == 0 and not multiple_roots:
-            err = "Derivative is zero"
-            return 0, None, err
-        elif multiple_roots and (fdx**2 - fx*fddx) == 0:
-            err = "Division by zero"
-            return 0, None, err
+            return {"error": "Derivative is zero"}
 
         # Newton or Modified Newton
-        if multiple_roots:
-            x = xn[n] - (fx*fdx)/(fdx**2 - fx*fddx)
+        xp = x
+        if multiple_roots and cancels(fdx**2, fx*fddx):
+            # The denominator cancels: redo the step with mpmath
+            escalated.append(n + 1)
+            fx, fdx, fddx = evaluate_precise(function.precise(2), x)
+            if fdx**2 - fx*fddx == 0:
+                return {"error": "Division by zero"}
+            x = float(xp - (fx*fdx)/(fdx**2 - fx*fddx))
+        elif multiple_roots:
+            if fdx**2 - fx*fddx == 0:
+                # Landing exactly on the root zeroes f, f' and f'' at once
+                if fx == 0:
+                    return {"root": x, "escalated": escalated}
+                return {"error": "Division by zero"}
+            x = xp - (fx*fdx)/(fdx**2 - fx*fddx)
         else:
-            x = xn[n] - evaluate(fxExp, xn[n])/fdx
+            x = xp - fx/fdx
 
-        xn.append(x)
-        fn.append(evaluate(fxExp, x))
-        E.append(error(x, xn[n], relativeError))
+        values = evaluate_all(kernel, x)
+        fn = values[0]
+        E = error(x, xp, relativeError)
         n += 1
+        yield [n, x, fn, E]
 
-    if n == niter or not (E[n] < tol):
-        err = f'Method failed in {niter} iterations'
-        return 0, None, err
-
-    table = {
-        "columns": ["n", "x", "f(x)", "error"],
-        "rows": [[i, xn[i], fn[i], E[i]] for i in range(n+1)],
-    }
-    return xn[n], table, None
+    if n == niter or not (E < tol):
+        return {"error": f'Method failed in {niter} iterations'}
+    return {"root": x, "escalated": escalated}
 
 
-def Secant(
+def Newton(
         x0: str,
-        x1: str,
         fx: str,
         tol: float,
         niter: int,
-        relativeError: bool) -> (float, dict, str):
+        multiple_roots: bool,
+        relativeError: bool,
+        history: str = "full",
+        historyK: int = 10) -> (float, dict, str):
+    steps = newton_steps(x0, fx, tol, niter, multiple_roots, relativeError)
+    return tabulate(steps, openColumns, history, historyK)
 
+
+def secant_steps(x0, x1, fx, tol, niter, relativeError):
     try:
         x0, x1 = parse_param(x0), parse_param(x1)
-        fxExp = parse_func(fx)
+        function = get_function(fx)
+        fxExp = function.func
     except Exception:
-        return 0, None, "Invalid function or interval"
+        return {"error": "Invalid function or interval"}
 
-    n = 1
-    E = [100, 100]
     fx0, fx1 = evaluate(fxExp, x0), evaluate(fxExp, x1)
-    xn, fx = [x0, x1], [fx0, fx1]
 
     if fx0 == 0:
-        return x0, None, None
+        return {"root": x0}
     elif fx1 == 0:
-        return x1, None, None
+        return {"root": x1}
+
+    n, E, escalated = 1, 100, []
+    yield [0, x0, fx0, E]
+    yield [1, x1, fx1, E]
 
     while n < niter:
-        xn.append(x1 - fx1*(x1-x0)/(fx1-fx0))
-        fx.append(evaluate(fxExp, xn[n]))
-        if fx[n] == 0:
-            return xn[n], None, None
+        x2, precise = secant_point(function, x0, x1, fx0, fx1)
+        if x2 is None:
+            return {"error": "Division by zero"}
+        fx2 = evaluate(fxExp, x2)
         n += 1
-        E.append(error(xn[n], xn[n-1], relativeError))
-        if E[n] < tol:
+        if precise:
+            escalated.append(n)
+        E = error(x2, x1, relativeError)
+        yield [n, x2, fx2, E]
+        if fx2 == 0:
+            return {"root": x2, "escalated": escalated}
+        if E < tol:
             break
-        x0, x1 = x1, xn[n]
-        fx0, fx1 = evaluate(fxExp, x0), evaluate(fxExp, x1)
-        if fx1 == fx0:
-            return 0, None, "Division by zero"
-
-    if n == niter or not (E[n] < tol):
-        err = f'Method failed in {niter} iterations'
-        return 0, None, err
-
-    table = {
-        "columns": ["n", "x", "f(x)", "error"],
-        "rows": [[i, xn[i], fx[i], E[i]] for i in range(n+1)],
-    }
-    return xn[n], table, None
+        x0, fx0, x1, fx1 = x1, fx1, x2, fx2
+
+    if n == niter or not (E < tol):
+        return {"error": f'Method failed in {niter} iterations'}
+    return {"root": x2, "escalated": escalated}
+
+
+def Secant(
+        x0: str,
+        x1: str,
+        fx: str,
+        tol: float,
+        niter: int,
+        relativeError: bool,
+        history: str = "full",
+        historyK: int = 10) -> (float, dict, str):
+    steps = secant_steps(x0, x1, fx, tol, niter, relativeError)
+    return tabulate(steps, openColumns, history, historyK)
+
+
+def brent_steps(a, b, fx, tol, niter, relativeError):
+    try:
+        a, b = parse_param(a), parse_param(b)
+        fxExp = parse_func(fx)
+        if b < a:
+            return {"error": "a must be less than b"}
+    except Exception:
+        return {"error": "Invalid function or interval"}
+
+    fa, fb = evaluate(fxExp, a), evaluate(fxExp, b)
+    evaluations = 2
+
+    if fa == 0:
+        return {"root": a}
+    elif fb == 0:
+        return {"root": b}
+    elif fa*fb >= 0:
+        return {"error": f'[{a}, {b}] is not a valid interval'}
+
+    # b is the best estimate, c the contrapoint and a the previous iterate
+    c, fc = a, fa
+    d = e = b - a
+    n = 0
+    while n <= niter:
+        if fb*fc > 0:
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+
+        m = (c - b) / 2
+        tol1 = 2 * 2.2e-16 * abs(b) + tol / 2
+        E = abs(m/b) if relativeError and b != 0 else abs(m)
+        yield [n, min(b, c), b, max(b, c), fb, E]
+        if E < tol or fb == 0:
+            break
+        if n == niter:
+            return {"error": f'Method failed in {niter} iterations'}
+
+        if abs(e) >= tol1 and abs(fa) > abs(fb):
+            # Secant (a == c) or inverse quadratic interpolation
+            s = fb / fa
+            if a == c:
+                p, q = 2*m*s, 1 - s
+            else:
+                q, r = fa / fc, fb / fc
+                p = s*(2*m*q*(q - r) - (b - a)*(r - 1))
+                q = (q - 1)*(r - 1)*(s - 1)
+            if p > 0:
+                q = -q
+            else:
+                p = -p
+            if 2*p < min(3*m*q - abs(tol1*q), abs(e*q)):
+                e, d = d, p / q
+            else:
+                d = e = m
+        else:
+            d = e = m
+
+        a, fa = b, fb
+        b += d if abs(d) > tol1 else (tol1 if m > 0 else -tol1)
+        fb = evaluate(fxExp, b)
+        evaluations += 1
+        n += 1
+
+    return {"root": b, "evaluations": evaluations}
+
+
+def Brent(
+        a: str,
+        b: str,
+        fx: str,
+        tol: float,
+        niter: int,
+        relativeError: bool,
+        history: str = "full",
+        historyK: int = 10) -> (float, dict, str):
+    steps = brent_steps(a, b, fx, tol, niter, relativeError)
+    return tabulate(steps, bracketColumns, history, historyK)
+
+
+def illinois_steps(a, b, fx, tol, niter, relativeError, andersonBjorck):
+    try:
+        a, b = parse_param(a), parse_param(b)
+        fxExp = parse_func(fx)
+        if b < a:
+            return {"error": "a must be less than b"}
+    except Exception:
+        return {"error": "Invalid function or interval"}
+
+    fa, fb = evaluate(fxExp, a), evaluate(fxExp, b)
+
+    if fa == 0:
+        return {"root": a}
+    elif fb == 0:
+        return {"root": b}
+    elif fa*fb >= 0:
+        return {"error": f'[{a}, {b}] is not a valid interval'}
+
+    n, E = 0, 100
+    xm = b - fb*(b-a)/(fb-fa)
+    fm = evaluate(fxExp, xm)
+    evaluations, retained = 3, None
+    yield [n, a, xm, b, fm, E]
+
+    while E > tol and n < niter:
+        if fm == 0:
+            break
+        # Scale the value kept at an endpoint retained twice in a row
+        if fm*fb < 0:
+            if retained == "b":
+                m = 1 - fm/fa if andersonBjorck else 0.5
+                fb *= m if m > 0 else 0.5
+            a, fa, retained = xm, fm, "b"
+        else:
+            if retained == "a":
+                m = 1 - fm/fb if andersonBjorck else 0.5
+                fa *= m if m > 0 else 0.5
+            b, fb, retained = xm, fm, "a"
+        n += 1
+        xp, xm = xm, b - fb*(b-a)/(fb-fa)
+        fm = evaluate(fxExp, xm)
+        evaluations += 1
+        E = error(xm, xp, relativeError)
+        yield [n, a, xm, b, fm, E]
+
+    if fm != 0 and (n == niter or not (E < tol)):
+        return {"error": f'Method failed in {niter} iterations'}
+    return {"root": xm, "evaluations": evaluations}
+
+
+def Illinois(
+        a: str,
+        b: str,
+        fx: str,
+        tol: float,
+        niter: int,
+        relativeError: bool,
+        andersonBjorck: bool = False,
+        history: str = "full",
+        historyK: int = 10) -> (float, dict, str):
+    steps = illinois_steps(a, b, fx, tol, niter, relativeError, andersonBjorck)
+    return tabulate(steps, bracketColumns, history, historyK)
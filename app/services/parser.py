@@ -0,0 +1,354 @@
+import math
+import re
+import numpy as np
+import sympy as sy
+
+# Parser for the expression grammar the API accepts: numbers, variables,
+# + - * / ^ (or **), parentheses, implicit multiplication ("2x", "x(x+1)",
+# "2sin(x)") and a whitelist of elementary functions and constants.
+# Expressions compile straight to Python closures over math/numpy; the SymPy
+# tree is only built when derivatives are needed. Nothing outside the
+# whitelist is ever evaluated.
+
+tokenPattern = re.compile(r"""
+    \s*(?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+      | (?P<op>\*\*|[-+*/^(),])
+    )""", re.VERBOSE)
+
+
+def _log(v, *base):
+    return np.log(v) / np.log(base[0]) if base else np.log(v)
+
+
+# name: (math, numpy, sympy)
+functions = {
+    "sin": (math.sin, np.sin, sy.sin),
+    "cos": (math.cos, np.cos, sy.cos),
+    "tan": (math.tan, np.tan, sy.tan),
+    "cot": (lambda v: 1/math.tan(v), lambda v: 1/np.tan(v), sy.cot),
+    "sec": (lambda v: 1/math.cos(v), lambda v: 1/np.cos(v), sy.sec),
+    "csc": (lambda v: 1/math.sin(v), lambda v: 1/np.sin(v), sy.csc),
+    "asin": (math.asin, np.arcsin, sy.asin),
+    "acos": (math.acos, np.arccos, sy.acos),
+    "atan": (math.atan, np.arctan, sy.atan),
+    "sinh": (math.sinh, np.sinh, sy.sinh),
+    "cosh": (math.cosh, np.cosh, sy.cosh),
+    "tanh": (math.tanh, np.tanh, sy.tanh),
+    "asinh": (math.asinh, np.arcsinh, sy.asinh),
+    "acosh": (math.acosh, np.arccosh, sy.acosh),
+    "atanh": (math.atanh, np.arctanh, sy.atanh),
+    "exp": (math.exp, np.exp, sy.exp),
+    "log": (math.log, _log, sy.log),
+    "ln": (math.log, _log, sy.log),
+    "log10": (math.log10, np.log10, lambda v: sy.log(v, 10)),
+    "log2": (math.log2, np.log2, lambda v: sy.log(v, 2)),
+    "sqrt": (math.sqrt, np.sqrt, sy.sqrt),
+    "abs": (abs, np.abs, sy.Abs),
+    "Abs": (abs, np.abs, sy.Abs),
+}
+# Number of arguments each function accepts
+arities = {name: (1, 1) for name in functions}
+arities["log"] = arities["ln"] = (1, 2)
+
+# Highest degree expanded by polynomial detection
+MAX_DEGREE = 512
+
+constants = {
+    "pi": (math.pi, sy.pi),
+    "E": (math.e, sy.E),
+    "e": (math.e, sy.E),
+}
+
+
+# Split an identifier into known names ("xsin" -> x, sin), longest first
+def split_name(name, variables):
+    known = sorted(set(variables) | set(functions) | set(constants),
+                   key=len, reverse=True)
+    parts = []
+    while name:
+        for candidate in known:
+            if name.startswith(candidate):
+                parts.append(candidate)
+                name = name[len(candidate):]
+                break
+        else:
+            raise ValueError(f'Unknown name {name}')
+    return parts
+
+
+def tokenize(expr, variables):
+    tokens, pos = [], 0
+    expr = expr.rstrip()
+    while pos < len(expr):
+        match = tokenPattern.match(expr, pos)
+        if match is None or match.end() == pos:
+            raise ValueError(f'Unexpected character {expr[pos:].strip()[0]}')
+        pos = match.end()
+        if match.group("number"):
+            tokens.append(("number", match.group("number")))
+        elif match.group("name"):
+            name = match.group("name")
+            if name in variables or name in functions or name in constants:
+                tokens.append(("name", name))
+            else:
+                tokens.extend(("name", n) for n in split_name(name, variables))
+        else:
+            op = match.group("op")
+            tokens.append(("op", "^" if op == "**" else op))
+    return tokens
+
+
+# Recursive-descent parser producing a tuple tree:
+#   ("number", text) ("var", name) ("const", name) ("neg", a)
+#   ("call", name, args) ("+" | "-" | "*" | "/" | "^", a, b)
+class Parser:
+    def __init__(self, tokens, variables):
+        self.tokens = tokens
+        self.variables = variables
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self, op=None):
+        token = self.peek()
+        if token is None or (op is not None and token != ("op", op)):
+            raise ValueError(f'Expected {op or "an operand"}')
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("Empty expression")
+        tree = self.expr()
+        if self.peek() is not None:
+            raise ValueError(f'Unexpected {self.peek()[1]}')
+        return tree
+
+    def expr(self):
+        tree = self.term()
+        while self.peek() in (("op", "+"), ("op", "-")):
+            op = self.take()[1]
+            tree = (op, tree, self.term())
+        return tree
+
+    # Starts an operand, so juxtaposition means multiplication
+    def implicit(self):
+        token = self.peek()
+        return token is not None and (token[0] != "op" or token[1] == "(")
+
+    def term(self):
+        tree = self.unary()
+        while True:
+            if self.peek() in (("op", "*"), ("op", "/")):
+                op = self.take()[1]
+                tree = (op, tree, self.unary())
+            elif self.implicit():
+                tree = ("*", tree, self.power())
+            else:
+                return tree
+
+    def unary(self):
+        if self.peek() == ("op", "-"):
+            self.take()
+            return ("neg", self.unary())
+        if self.peek() == ("op", "+"):
+            self.take()
+            return self.unary()
+        return self.power()
+
+    def power(self):
+        tree = self.atom()
+        if self.peek() == ("op", "^"):
+            self.take()
+            return ("^", tree, self.unary())
+        return tree
+
+    def atom(self):
+        kind, value = self.take()
+        if kind == "number":
+            return ("number", value)
+        if kind == "op":
+            if value != "(":
+                raise ValueError(f'Unexpected {value}')
+            tree = self.expr()
+            self.take(")")
+            return tree
+        if value in self.variables:
+            return ("var", value)
+        if value in constants:
+            return ("const", value)
+        return self.call(value)
+
+    def call(self, name):
+        if self.peek() != ("op", "("):
+            # Application without parentheses: "sin x"
+            return ("call", name, [self.power()])
+        self.take("(")
+        args = [self.expr()]
+        while self.peek() == ("op", ","):
+            self.take(",")
+            args.append(self.expr())
+        self.take(")")
+        low, high = arities[name]
+        if not low <= len(args) <= high:
+            raise ValueError(f'Wrong number of arguments for {name}')
+        return ("call", name, args)
+
+
+def parse(expr, variables=("x",)):
+    return Parser(tokenize(expr, variables), variables).parse()
+
+
+# Python source of a tree; names refer to the compile namespace
+def to_source(tree):
+    kind = tree[0]
+    if kind == "number":
+        value = float(tree[1])
+        if not math.isfinite(value):
+            raise ValueError(f'Number out of range {tree[1]}')
+        # Float literals keep huge integer powers from running as bignums
+        return repr(value)
+    if kind in ("var", "const"):
+        return tree[1]
+    if kind == "neg":
+        return f'(-{to_source(tree[1])})'
+    if kind == "call":
+        return f'{tree[1]}({", ".join(to_source(a) for a in tree[2])})'
+    op = "**" if kind == "^" else kind
+    return f'({to_source(tree[1])} {op} {to_source(tree[2])})'
+
+
+# Compile a tree into a closure over the variables, using math (scalar) or
+# numpy (vectorized) functions
+def compile_tree(tree, variables=("x",), vectorized=False):
+    namespace = {"__builtins__": {}}
+    for name, impls in functions.items():
+        namespace[name] = impls[1 if vectorized else 0]
+    for name, (value, _) in constants.items():
+        namespace[name] = value
+    source = f'lambda {", ".join(variables)}: {to_source(tree)}'
+    return eval(compile(source, "<expression>", "eval"), namespace)
+
+
+# Source of a straight-line Horner evaluation of p and its first `order`
+# derivatives in a single pass (coefficients highest degree first)
+def horner_source(coefficients, order=0):
+    lines = [f'    p0 = {float(coefficients[0])!r}']
+    lines += [f'    p{k} = 0.0' for k in range(1, order + 1)]
+    for c in coefficients[1:]:
+        for k in range(order, 0, -1):
+            lines.append(f'    p{k} = p{k}*x + p{k-1}')
+        lines.append(f'    p0 = p0*x + {float(c)!r}')
+    # p_k accumulates p^(k)(x) / k!
+    values = [f'{math.factorial(k)}.0*p{k}' if k > 1 else f'p{k}'
+              for k in range(order + 1)]
+    result = values[0] if order == 0 else f'({", ".join(values)},)'
+    return "def horner(x):\n" + "\n".join(lines) + f'\n    return {result}\n'
+
+
+# Compile a Horner evaluator; works on floats, complex numbers and arrays
+def compile_horner(coefficients, order=0):
+    if len(coefficients) == 0:
+        coefficients = [0.0]
+    namespace = {"__builtins__": {}}
+    exec(compile(horner_source(coefficients, order), "<horner>", "exec"),
+         namespace)
+    return namespace["horner"]
+
+
+# SymPy tree of a parsed expression (for derivatives)
+def to_sympy(tree, symbols):
+    kind = tree[0]
+    if kind == "number":
+        text = tree[1]
+        if re.fullmatch(r"\d+", text):
+            return sy.Integer(text)
+        return sy.Float(text)
+    if kind == "var":
+        return symbols[tree[1]]
+    if kind == "const":
+        return constants[tree[1]][1]
+    if kind == "neg":
+        return -to_sympy(tree[1], symbols)
+    if kind == "call":
+        return functions[tree[1]][2](*(to_sympy(a, symbols)
+                                       for a in tree[2]))
+    a, b = to_sympy(tree[1], symbols), to_sympy(tree[2], symbols)
+    if kind == "+":
+        return a + b
+    if kind == "-":
+        return a - b
+    if kind == "*":
+        return a * b
+    if kind == "/":
+        return a / b
+    return a ** b
+
+
+# Coefficients (highest degree first) of a polynomial in the given variable,
+# or None. Without expand only polynomials written as a sum of monomials are
+# accepted: expanding a factored form such as (x-1)^10 into coefficients loses
+# accuracy near its roots.
+def polynomial(tree, variable="x", expand=False):
+    with np.errstate(all="ignore"):
+        coefficients = _polynomial(tree, variable, expand)
+    if coefficients is None or not np.isfinite(coefficients).all():
+        return None
+    return np.trim_zeros(coefficients[::-1], "f")
+
+
+# Coefficient arrays here are lowest degree first
+def _polynomial(tree, variable, expand):
+    kind = tree[0]
+    if kind == "number":
+        return np.array([float(tree[1])])
+    if kind == "const":
+        return np.array([constants[tree[1]][0]])
+    if kind == "var":
+        return np.array([0.0, 1.0]) if tree[1] == variable else None
+    if kind == "call":
+        # Functions of constants only, e.g. sqrt(2)
+        args = [_polynomial(a, variable, expand) for a in tree[2]]
+        if any(a is None or len(a) > 1 for a in args):
+            return None
+        try:
+            return np.array([float(functions[tree[1]][0](
+                *(float(a[0]) for a in args)))])
+        except (ArithmeticError, ValueError):
+            return None
+    if kind == "neg":
+        a = _polynomial(tree[1], variable, expand)
+        return None if a is None else -a
+
+    a = _polynomial(tree[1], variable, expand)
+    b = _polynomial(tree[2], variable, expand)
+    if a is None or b is None:
+        return None
+    if kind in ("+", "-"):
+        size = max(len(a), len(b))
+        a, b = np.pad(a, (0, size - len(a))), np.pad(b, (0, size - len(b)))
+        return a + b if kind == "+" else a - b
+    if kind == "*":
+        if not expand and len(a) > 1 and len(b) > 1:
+            return None
+        return np.convolve(a, b)
+    if kind == "/":
+        return a / b[0] if len(b) == 1 else None
+
+    # Powers: constant bases, or non-negative integer exponents of the
+    # variable (of any polynomial when expanding)
+    if len(b) > 1:
+        return None
+    if len(a) == 1:
+        return np.array([a[0] ** b[0]])
+    if b[0] != int(b[0]) or not 0 <= b[0] <= MAX_DEGREE:
+        return None
+    if not expand and tree[1] != ("var", variable):
+        return None
+    result = np.array([1.0])
+    for _ in range(int(b[0])):
+        result = np.convolve(result, a)
+    return result
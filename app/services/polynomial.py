@@ -0,0 +1,67 @@
+import numpy as np
+from services.budget import charge
+from services.batch import to_float
+from services.expressions import get_function
+import services.parser as parser
+
+
+# Newton polish of (complex) roots using p and p' from one Horner pass.
+# Steps that do not reduce |p| are rejected: near multiple roots the
+# computed p is rounding noise and Newton would wander off.
+def polish(coefficients, roots, tol, niter):
+    kernel = parser.compile_horner(coefficients, 1)
+    roots = roots.astype(complex)
+    iterations = np.zeros(len(roots), dtype=int)
+    for i, z in enumerate(roots):
+        charge()
+        p, dp = kernel(z)
+        for n in range(1, niter + 1):
+            if p == 0 or dp == 0:
+                break
+            step = p / dp
+            zn = z - step
+            charge()
+            pn, dpn = kernel(zn)
+            if not np.isfinite(pn) or abs(pn) >= abs(p):
+                break
+            z, p, dp = zn, pn, dpn
+            iterations[i] = n
+            if abs(step) <= tol * max(1.0, abs(z)):
+                break
+        roots[i] = z
+    return roots, iterations
+
+
+def Poly_roots(fx: str, polish_roots: bool, tol: float,
+               niter: int) -> (dict, str):
+    try:
+        tree = get_function(fx).tree
+    except Exception:
+        return None, "Invalid function"
+    coefficients = parser.polynomial(tree, "x", expand=True)
+    if coefficients is None:
+        return None, "The function is not a polynomial in x"
+    if len(coefficients) == 0:
+        return None, "The polynomial is identically zero"
+    if len(coefficients) == 1:
+        return None, "The polynomial is a non-zero constant and has no roots"
+
+    # Eigenvalues of the companion matrix
+    roots = np.roots(coefficients)
+    iterations = np.zeros(len(roots), dtype=int)
+    if polish_roots:
+        roots, iterations = polish(coefficients, roots, tol, niter)
+
+    # Imaginary parts at rounding level are treated as real roots
+    imag = np.abs(roots.imag)
+    real = imag <= np.sqrt(np.finfo(float).eps) * np.maximum(1, np.abs(roots))
+    order = np.lexsort((roots.imag, roots.real))
+    return {
+        "degree": len(coefficients) - 1,
+        "coefficients": coefficients.tolist(),
+        "real": [to_float(r) for r in roots.real[order][real[order]]],
+        "complex": [{"real": to_float(z.real), "imag": to_float(z.imag)}
+                    for z in roots[order][~real[order]]],
+        "polished": polish_roots,
+        "iterations": iterations[order].tolist(),
+    }, None
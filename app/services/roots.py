@@ -0,0 +1,129 @@
+import numpy as np
+from services.expressions import get_function, evaluate_vector, parse_param
+import services.batch as BatchService
+
+SUBDIVISIONS = 8
+STEEP = 10
+
+
+# Intervals whose samples suggest hidden roots: |f| changes rapidly across
+# them, or they touch an exact zero or a local minimum of |f| with no sign
+# change around it
+def refine_mask(xs, fs, min_width):
+    df = np.abs(np.diff(fs))
+    finite = np.isfinite(df)
+    steep = np.zeros(len(df), dtype=bool)
+    if finite.any():
+        steep[finite] = df[finite] > STEEP * np.median(df[finite])
+
+    af = np.abs(fs)
+    minima = np.zeros(len(fs), dtype=bool)
+    minima[1:-1] = (af[1:-1] < af[:-2]) & (af[1:-1] < af[2:]) & \
+        (fs[:-2]*fs[1:-1] > 0) & (fs[1:-1]*fs[2:] > 0)
+    minima |= fs == 0
+    near = minima[:-1] | minima[1:]
+
+    return (steep | near) & (np.diff(xs) > min_width)
+
+
+# Sample f on a uniform grid and subdivide the flagged intervals
+def sample(f, a, b, points, depth, tol):
+    xs = np.linspace(a, b, points + 1)
+    fs = evaluate_vector(f, xs)
+    t = np.linspace(0, 1, SUBDIVISIONS + 1)[1:-1]
+
+    for _ in range(depth):
+        flagged = np.flatnonzero(refine_mask(xs, fs, tol))
+        if len(flagged) == 0:
+            break
+        # Keep the number of new samples per level bounded
+        if len(flagged) > points:
+            df = np.nan_to_num(np.abs(np.diff(fs))[flagged], nan=np.inf)
+            flagged = flagged[np.argsort(df)[-points:]]
+        left, width = xs[flagged], xs[flagged + 1] - xs[flagged]
+        new = (left[:, None] + width[:, None]*t).ravel()
+        xs = np.concatenate([xs, new])
+        fs = np.concatenate([fs, evaluate_vector(f, new)])
+        order = np.argsort(xs)
+        xs, fs = xs[order], fs[order]
+
+    return xs, fs
+
+
+# Tangent roots: local minima of |f| where f' changes sign and f vanishes
+def tangent_roots(function, xs, fs, tol, niter):
+    af = np.abs(fs)
+    minima = np.flatnonzero(
+        (af[1:-1] <= af[:-2]) & (af[1:-1] <= af[2:]) &
+        (fs[:-2]*fs[1:-1] > 0) & (fs[1:-1]*fs[2:] > 0)) + 1
+    if len(minima) == 0:
+        return np.empty(0)
+
+    fd = function.vector(1)
+    a, b = xs[minima - 1], xs[minima + 1]
+    roots, _, _, status = BatchService.Illinois(
+        fd, a, b, tol, niter, False, None)
+    roots = roots[status == BatchService.CONVERGED]
+    froots = evaluate_vector(function.vector(), roots)
+    return roots[np.abs(froots) < tol]
+
+
+def All_roots(
+        a: str,
+        b: str,
+        fx: str,
+        tol: float,
+        niter: int,
+        points: int,
+        depth: int) -> (dict, str):
+    try:
+        a, b = parse_param(a), parse_param(b)
+        function = get_function(fx)
+        f = function.vector()
+        if b <= a:
+            return None, "a must be less than b"
+        if points < 2:
+            return None, "points must be at least 2"
+    except Exception:
+        return None, "Invalid function or interval"
+
+    xs, fs = sample(f, a, b, points, depth, tol)
+
+    # Exact zeros on the grid and sign-change brackets
+    exact = xs[fs == 0]
+    brackets = np.flatnonzero(fs[:-1]*fs[1:] < 0)
+    left, right = xs[brackets], xs[brackets + 1]
+    roots, iters, _, status = BatchService.Illinois(
+        f, left, right, tol, niter, False, None)
+
+    # Drop failures and sign changes across poles, where |f| grows instead
+    keep = (status == BatchService.CONVERGED) & (
+        np.abs(evaluate_vector(f, roots)) <=
+        np.minimum(np.abs(fs[brackets]), np.abs(fs[brackets + 1])))
+    found = [(x, "exact", 0) for x in exact]
+    found += [(x, "sign change", int(n))
+              for x, n in zip(roots[keep], iters[keep])]
+    try:
+        found += [(x, "tangent", None)
+                  for x in tangent_roots(function, xs, fs, tol, niter)]
+    except Exception:
+        # Derivative not available; tangent roots are skipped
+        pass
+
+    # Deduplicate roots closer than tol
+    found.sort(key=lambda r: r[0])
+    unique = []
+    for root in found:
+        if not unique or root[0] - unique[-1][0] > tol:
+            unique.append(root)
+
+    froots = evaluate_vector(f, np.array([r[0] for r in unique]))
+    data = {
+        "roots": [float(r[0]) for r in unique],
+        "samples": len(xs),
+        "brackets": len(brackets),
+        "columns": ["n", "root", "f(root)", "iterations", "kind"],
+        "rows": [[i, float(r[0]), BatchService.to_float(fr), r[2], r[1]]
+                 for i, (r, fr) in enumerate(zip(unique, froots))],
+    }
+    return data, None
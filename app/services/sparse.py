@@ -0,0 +1,200 @@
+import numpy as np
+
+# Average rows per level below which a Gauss-Seidel/SOR sweep runs row by
+# row in plain Python instead of level by level in NumPy (banded matrices
+# form long dependency chains with one row per level)
+MIN_LEVEL_SIZE = 32
+
+
+# Expand [starts[k], starts[k] + counts[k]) ranges into one index array
+def ranges(starts, counts):
+    total = counts.sum()
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.arange(total) - offsets + np.repeat(starts, counts)
+
+
+# Compressed sparse row matrix
+class CSRMatrix:
+    def __init__(self, data, indices, indptr, shape):
+        self.data = np.asarray(data, dtype=float)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.shape = tuple(shape)
+        n, m = self.shape
+        if n < 0 or m < 0 or len(self.indptr) != n + 1 or \
+                self.indptr[0] != 0 or (np.diff(self.indptr) < 0).any() or \
+                self.indptr[-1] != len(self.indices) or \
+                len(self.indices) != len(self.data):
+            raise ValueError("Inconsistent CSR arrays")
+        if len(self.indices) and \
+                (self.indices.min() < 0 or self.indices.max() >= m):
+            raise ValueError("Column index out of range")
+        self.rows = np.repeat(np.arange(n), np.diff(self.indptr))
+
+    @classmethod
+    def from_coo(cls, row, col, data, shape):
+        row = np.asarray(row, dtype=np.int64)
+        col = np.asarray(col, dtype=np.int64)
+        data = np.asarray(data, dtype=float)
+        n, m = shape
+        if n <= 0 or m <= 0:
+            raise ValueError("Invalid shape")
+        if not len(row) == len(col) == len(data):
+            raise ValueError("Inconsistent COO arrays")
+        if len(row) and (row.min() < 0 or row.max() >= n or
+                         col.min() < 0 or col.max() >= m):
+            raise ValueError("Index out of range")
+        # Sort by (row, col) and sum duplicate entries
+        keys = row * m + col
+        unique, inverse = np.unique(keys, return_inverse=True)
+        summed = np.bincount(inverse, weights=data, minlength=len(unique))
+        rows, cols = unique // m, unique % m
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows,
+                                                            minlength=n))))
+        return cls(summed, cols, indptr, shape)
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    def diagonal(self):
+        d = np.zeros(min(self.shape))
+        mask = self.rows == self.indices
+        np.add.at(d, self.rows[mask], self.data[mask])
+        return d
+
+    def matvec(self, x):
+        return np.bincount(self.rows, weights=self.data * x[self.indices],
+                           minlength=self.shape[0])
+
+    def to_dense(self):
+        dense = np.zeros(self.shape)
+        np.add.at(dense, (self.rows, self.indices), self.data)
+        return dense
+
+
+# Build a CSRMatrix from the sparse input of the systems endpoints:
+#   {"format": "coo", "shape": [n, m], "row": [...], "col": [...], "data": [...]}
+#   {"format": "csr", "shape": [n, m], "indptr": [...], "indices": [...],
+#    "data": [...]}
+def from_input(A):
+    if isinstance(A, CSRMatrix):
+        return A
+    if A["format"] == "coo":
+        return CSRMatrix.from_coo(A["row"], A["col"], A["data"], A["shape"])
+    if A["format"] == "csr":
+        return CSRMatrix(A["data"], A["indices"], A["indptr"], A["shape"])
+    raise ValueError(f'Unknown sparse format {A["format"]}')
+
+
+# Jacobi and Gauss-Seidel/SOR sweeps over the off-diagonal CSR entries. A
+# sweep costs O(nnz) and the iteration matrix T is never formed. Blocks of
+# right-hand sides (x and b of n x k) are swept one column at a time: the
+# sweeps are bound by their gathers, and gathering k columns at once is
+# slower than k single sweeps.
+class Sweeps:
+    def __init__(self, A: CSRMatrix, b, w=1):
+        self.n = A.shape[0]
+        self.b = b
+        self.w = w
+        self.d = A.diagonal()
+        off = A.rows != A.indices
+        self.rows = A.rows[off]
+        self.cols = A.indices[off]
+        self.vals = A.data[off]
+        self.indptr = np.concatenate(
+            ([0], np.cumsum(np.bincount(self.rows, minlength=self.n))))
+        self._levels = None
+        self._sequential = False
+
+    def jacobi(self, x):
+        if x.ndim == 2:
+            return np.stack([self._jacobi(x[:, j], self.b[:, j])
+                             for j in range(x.shape[1])], axis=1)
+        return self._jacobi(x, self.b)
+
+    def sor(self, x):
+        if x.ndim == 2:
+            for j in range(x.shape[1]):
+                x[:, j] = self._sor(x[:, j].copy(), self.b[:, j])
+            return x
+        return self._sor(x, self.b)
+
+    def _jacobi(self, x, b):
+        sigma = np.bincount(self.rows, weights=self.vals * x[self.cols],
+                            minlength=self.n)
+        return (b - sigma) / self.d
+
+    # In-place forward sweep, equivalent to x = T x + C with
+    # T = (D - wL)^-1 ((1-w)D + wU), C = w (D - wL)^-1 b
+    def _sor(self, x, b):
+        levels = self.levels()
+        if levels is None:
+            return self._row_sweep(x, b)
+        w, d = self.w, self.d
+        for R, cols, vals, local in levels:
+            sigma = np.bincount(local, weights=vals * x[cols],
+                                minlength=len(R))
+            x[R] = (1-w)*x[R] + w*(b[R] - sigma)/d[R]
+        return x
+
+    def _row_sweep(self, x, b):
+        w, b, d = self.w, b.tolist(), self.d.tolist()
+        cols, vals, ptr = self.cols.tolist(), self.vals.tolist(), \
+            self.indptr.tolist()
+        xs = x.tolist()
+        for i in range(self.n):
+            s = b[i]
+            for k in range(ptr[i], ptr[i+1]):
+                s -= vals[k]*xs[cols[k]]
+            xs[i] = (1-w)*xs[i] + w*s/d[i]
+        x[:] = xs
+        return x
+
+    # Level schedule: row i must follow every row j < i it reads (new
+    # values) and precede every row j > i it reads (old values), so each
+    # off-diagonal entry is an edge min(i, j) -> max(i, j). Rows in the same
+    # level are independent and updated together.
+    def levels(self):
+        if self._sequential or self._levels is not None:
+            return self._levels
+        n = self.n
+        src = np.minimum(self.rows, self.cols)
+        dst = np.maximum(self.rows, self.cols)
+        edges = np.unique(src * n + dst)
+        src, dst = edges // n, edges % n
+        outptr = np.concatenate(([0], np.cumsum(np.bincount(src,
+                                                            minlength=n))))
+        indegree = np.bincount(dst, minlength=n)
+
+        level = np.zeros(n, dtype=np.int64)
+        frontier = np.flatnonzero(indegree == 0)
+        count = 0
+        while frontier.size:
+            level[frontier] = count
+            count += 1
+            if count * MIN_LEVEL_SIZE > n:
+                # Too sequential for level sweeps
+                self._sequential = True
+                return None
+            targets = dst[ranges(outptr[frontier],
+                                 outptr[frontier+1] - outptr[frontier])]
+            np.subtract.at(indegree, targets, 1)
+            targets = np.unique(targets)
+            frontier = targets[indegree[targets] == 0]
+
+        order = np.argsort(level, kind="stable")
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(level))))
+        counts = np.diff(self.indptr)[order]
+        entries = ranges(self.indptr[order], counts)
+        # Position of every row within its level, repeated per entry
+        local = np.repeat(np.arange(n) - bounds[level[order]], counts)
+        entryBounds = np.concatenate(([0], np.cumsum(counts)))[bounds]
+
+        self._levels = []
+        for k in range(count):
+            rows = order[bounds[k]:bounds[k+1]]
+            segment = entries[entryBounds[k]:entryBounds[k+1]]
+            self._levels.append((rows, self.cols[segment], self.vals[segment],
+                                 local[entryBounds[k]:entryBounds[k+1]]))
+        return self._levels
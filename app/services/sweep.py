@@ -0,0 +1,147 @@
+import numpy as np
+from services.expressions import get_function, parse_param
+from services.batch import to_list
+from services.budget import charge
+
+statuses = ["newton", "bracketing", "failed"]
+NEWTON, BRACKETING, FAILED = range(len(statuses))
+EXPANSIONS = 60
+
+
+# Vectorized Newton on f(x; p) = 0 for many (x, p) pairs at once
+def newton(f, fd, x, p, tol, niter, relativeError):
+    x = x.copy()
+    iters = np.zeros(len(x), dtype=int)
+    converged = np.zeros(len(x), dtype=bool)
+    active = np.isfinite(x)
+    for _ in range(niter):
+        if not active.any():
+            break
+        idx = np.flatnonzero(active)
+        charge(2*len(idx))
+        with np.errstate(all="ignore"):
+            fx = np.broadcast_to(f(x[idx], p[idx]), idx.shape)
+            fdx = np.broadcast_to(fd(x[idx], p[idx]), idx.shape)
+            xn = x[idx] - fx/fdx
+            err = np.abs(xn - x[idx])
+            if relativeError:
+                err = err/np.abs(xn)
+        iters[idx] += 1
+        ok = np.isfinite(xn) & np.isfinite(err)
+        x[idx[ok]] = xn[ok]
+        done = ok & ((err < tol) | (fx == 0))
+        converged[idx[done]] = True
+        active[idx[done | ~ok]] = False
+    return x, iters, converged
+
+
+# Scalar fallback: expand a bracket around the guess, then bisect
+def bracketing(f, guess, p, tol, niter):
+    try:
+        return bisect_around(f, guess, p, tol, niter)
+    except (ArithmeticError, ValueError):
+        return np.nan, 0
+
+
+def bisect_around(f, guess, p, tol, niter):
+    guess = guess if np.isfinite(guess) else 0.0
+    h = max(abs(guess), 1.0) * 1e-2
+    fg = f(guess, p)
+    if fg == 0:
+        return guess, 0
+    for _ in range(EXPANSIONS):
+        a, b = guess - h, guess + h
+        fa, fb = f(a, p), f(b, p)
+        charge(2)
+        if fa*fg <= 0:
+            b, fb = guess, fg
+            break
+        if fb*fg <= 0:
+            a, fa = guess, fg
+            break
+        h *= 2
+    else:
+        return np.nan, 0
+
+    for n in range(1, niter + 1):
+        xm = (a + b) / 2
+        fm = f(xm, p)
+        charge()
+        if fm == 0 or (b - a) / 2 < tol:
+            return xm, n
+        if fa*fm < 0:
+            b = xm
+        else:
+            a, fa = xm, fm
+    return np.nan, niter
+
+
+# Solve one step of the continuation for every chunk, falling back to
+# bracketing where Newton fails
+def solve(f, fd, fs, guess, p, tol, niter, relativeError):
+    x, iters, converged = newton(f, fd, guess, p, tol, niter, relativeError)
+    status = np.where(converged, NEWTON, FAILED)
+    for i in np.flatnonzero(~converged):
+        root, n = bracketing(fs, guess[i], p[i], tol, niter)
+        if np.isfinite(root):
+            x[i], iters[i], status[i] = root, iters[i] + n, BRACKETING
+        else:
+            x[i] = np.nan
+    return x, iters, status
+
+
+def Sweep(
+        fx: str,
+        p: list,
+        x0: str,
+        tol: float,
+        niter: int,
+        relativeError: bool,
+        chunks: int = 8) -> (dict, str):
+    try:
+        x0 = parse_param(x0)
+        # Names other than x, p and the whitelisted functions are rejected
+        function = get_function(fx, ("x", "p"))
+        f, fd = function.vector(), function.vector(1)
+        fs = function.func
+        p = np.asarray(p, dtype=float)
+        if p.ndim != 1 or len(p) == 0:
+            return None, "p must be a non-empty list"
+    except Exception:
+        return None, "Invalid function or parameters"
+
+    m = len(p)
+    chunks = max(1, min(chunks, m))
+    starts = np.linspace(0, m, chunks + 1).astype(int)
+    lengths = np.diff(starts)
+
+    # Coarse pass: continuation over the first point of every chunk
+    guess = np.empty(chunks)
+    root = x0
+    for c in range(chunks):
+        x, _, status = solve(f, fd, fs, np.array([root]), p[starts[c]:][:1],
+                             tol, niter, relativeError)
+        root = x[0] if status[0] != FAILED else root
+        guess[c] = root
+
+    # Fine pass: all chunks advance together, each warm-started from the
+    # previous root of its own chunk
+    roots = np.full(m, np.nan)
+    iters = np.zeros(m, dtype=int)
+    status = np.full(m, FAILED)
+    for j in range(lengths.max()):
+        live = np.flatnonzero(lengths > j)
+        idx = starts[live] + j
+        x, n, s = solve(f, fd, fs, guess[live], p[idx],
+                        tol, niter, relativeError)
+        roots[idx], iters[idx], status[idx] = x, n, s
+        guess[live] = np.where(s != FAILED, x, guess[live])
+
+    return {
+        "p": p.tolist(),
+        "x": to_list(roots),
+        "iterations": iters.tolist(),
+        "status": [statuses[s] for s in status],
+        "converged": int((status != FAILED).sum()),
+        "failed": int((status == FAILED).sum()),
+    }, None
@@ -1,4 +1,16 @@
+import numpy as np
 import sympy as sy
+from services.budget import charge
+from services.metrics import phase
+from services.history import History, run_steps
+from services.ingest import resolve
+from services.sparse import CSRMatrix, Sweeps, from_input
+from services.convergence import check, homogeneous, optimal_w, \
+    sweep_radius, with_rhs
+
+columns = ["n", "x", "error"]
+# Rows per block of the dense Gauss-Seidel/SOR forward substitution
+BLOCK = 64
 
 def print_matrix(matrix: sy.Matrix, n: int):
     for i in range(n):
@@ -26,57 +38,448 @@ def t_and_c(
     print(C)
     return T, C
 
-def Iterative_methods(
-        A: list,
-        b: list,
-        x0: list,
-        tol: float,
-        niter: int,
-        method: str,
-        relativeError: bool,
-        w: float = 1) -> (list, dict, str):
+# Exact iteration on SymPy matrices (rational arithmetic for integer input),
+# kept for teaching small systems step by step
+def exact_steps(A, b, x0, tol, niter, method, relativeError, w=1,
+                checkConvergence=True):
     try:
-        A = sy.Matrix(A)
-        b = sy.Matrix(b)
-        x0 = sy.Matrix(x0)
+        with phase("parse"):
+            A = sy.Matrix(A)
+            b = sy.Matrix(b)
+            x0 = sy.Matrix(x0)
         print(w)
         if A.rows != A.cols or A.rows != b.rows or x0.rows != A.rows:
-            return None, "Invalid dimensions"
-        if not (0 <= w and w <= 2):
-            return None, "W must be between 0 and 2"
+            return {"error": "Invalid dimensions"}
+        if w != "auto" and not (0 <= w and w <= 2):
+            return {"error": "W must be between 0 and 2"}
     except Exception:
-        return None, "Error in the input"
+        return {"error": "Error in the input"}
     err = tol + 1
     n = 0
 
-    E, x_values = [100], [[float(x) for x in x0.flat()]]
-
     diag = A.diagonal()
     if 0 in diag:
-        return None, "A contains zeros in its diagonal"
+        return {"error": "A contains zeros in its diagonal"}
+
+    relaxation = None
+    if w == "auto":
+        # Chosen in floating point, then iterated exactly
+        with phase("setup"):
+            sweeps = DenseSweeps(np.array(A.evalf(), dtype=float),
+                                 np.array(b.evalf(), dtype=float).ravel(), w)
+            relaxation = resolve_w(sweeps, method,
+                                   np.array(x0.evalf(), dtype=float).ravel(),
+                                   tol, relativeError)
+            w = sweeps.w
 
-    T, C = t_and_c(A, b, method, w)
+    with phase("setup"):
+        T, C = t_and_c(A, b, method, w)
+    convergence = None
+    if checkConvergence:
+        with phase("check"):
+            # Small systems: the eigenvalues of T give rho exactly
+            rho = float(np.abs(np.linalg.eigvals(
+                np.array(T.evalf(), dtype=float))).max())
+            x1 = np.array((T*x0 + C).evalf(), dtype=float).ravel()
+            convergence, error = check(
+                rho, x1 - np.array(x0.evalf(), dtype=float).ravel(), x1,
+                tol, relativeError)
+        if error:
+            return {"error": error}
+    yield [n, [float(x) for x in x0.flat()], 100]
 
     while err > tol and n < niter:
+        charge()
         x1 = T*x0 + C
         if relativeError:
             err = (x1 - x0).norm(sy.oo)/x1.norm(sy.oo)
         else:
             err = (x1 - x0).norm(sy.oo)
         x0 = x1
-        x_values.append([float(x) for x in x1.flat()])
-        E.append(float(err))
         n += 1
+        yield [n, [float(x) for x in x1.flat()], float(err)]
     if n == niter:
-        return None, f'Method failed in {n} iterations'
+        return {"error": failure(n, convergence)}
 
-    data = {
+    result = {
         "T": [[float(x) for x in row] for row in T.tolist()],
         "C": [float(x) for x in C.flat()],
         "x": [float(x) for x in x0.flat()],
-        "columns": ["n", "x", "error"],
-        "rows": [[i, x_values[i], E[i]] for i in range(n+1)]
+        "convergence": convergence,
     }
+    if relaxation:
+        result["relaxation"] = relaxation
+    return result
 
-    return data, None
 
+# Per-row values shaped to broadcast against x, a vector or an n x k block
+def rowwise(values, x):
+    return values if x.ndim == 1 else values[:, None]
+
+
+def float_t_and_c(A, b, method, w):
+    d = np.diag(A)
+    L, U = -np.tril(A, -1), -np.triu(A, 1)
+
+    if method == "jacobi":
+        T = (L + U) / d[:, None]
+        C = b / rowwise(d, b)
+    else:
+        M = np.diag(d) - w*L
+        T = np.linalg.solve(M, (1-w)*np.diag(d) + w*U)
+        C = w*np.linalg.solve(M, b)
+    return T, C
+
+
+# Jacobi and Gauss-Seidel/SOR sweeps on a dense matrix without forming T.
+# The SOR sweep is a forward substitution by blocks of rows: the rows before
+# a block hold new values and the rows after it old ones, so their
+# contribution is one matrix-vector product; inside the block the small
+# triangular system (D + wL) x = rhs is solved directly. x and b are
+# vectors, or n x k blocks iterated together.
+class DenseSweeps:
+    def __init__(self, A, b, w=1):
+        self.A = A
+        self.b = b
+        self.w = w
+        self.d = np.diag(A).copy()
+        self.blocks = []
+
+    def jacobi(self, x):
+        return (self.b - self.A @ x) / rowwise(self.d, x) + x
+
+    def sor(self, x):
+        if not self.blocks:
+            self._factor()
+        A, b, d, w = self.A, self.b, rowwise(self.d, x), self.w
+        for s, e, D, L, U in self.blocks:
+            r = b[s:e] - A[s:e, :s] @ x[:s] - A[s:e, e:] @ x[e:]
+            rhs = (1-w)*d[s:e]*x[s:e] - w*(U @ x[s:e]) + w*r
+            x[s:e] = np.linalg.solve(D + w*L, rhs)
+        return x
+
+    # Diagonal blocks split into D, L and U; w is applied at sweep time so
+    # copies with another w share them
+    def _factor(self):
+        A = self.A
+        for s in range(0, len(A), BLOCK):
+            e = min(s + BLOCK, len(A))
+            block = A[s:e, s:e]
+            self.blocks.append((s, e, np.diag(np.diag(block)),
+                                np.tril(block, -1), np.triu(block, 1)))
+
+
+# Spectral radius of the sweep operator, plus the first step of the
+# iteration for the iteration count estimate. With a block of right-hand
+# sides the Arnoldi estimate starts from the largest first step.
+def sweep_check(sweeps, method, x0, tol, relativeError):
+    linear = homogeneous(sweeps)
+    if method == "jacobi":
+        x1 = sweeps.jacobi(x0)
+    else:
+        x1 = sweeps.sor(x0.copy())
+    step = x1 - x0
+    start = step if step.ndim == 1 else \
+        step[:, np.abs(step).max(axis=0).argmax()]
+    rho, exact = sweep_radius(linear, method, start)
+    return check(rho, step, x1, tol, relativeError, exact)
+
+
+# Resolve w = "auto" on the sweeps; Jacobi has no relaxation factor
+def resolve_w(sweeps, method, x0, tol, relativeError):
+    if method == "jacobi":
+        sweeps.w = 1
+        return None
+    sweeps.w, relaxation = optimal_w(sweeps, x0, tol, relativeError)
+    return relaxation
+
+
+def failure(n, convergence):
+    if convergence and convergence["estimatedIterations"]:
+        return f'Method failed in {n} iterations ' \
+            f'(about {convergence["estimatedIterations"]} needed)'
+    return f'Method failed in {n} iterations'
+
+
+# The iterates overflowed (possible when the convergence check is off or
+# only had an estimate of rho)
+def diverged(n):
+    return f'Method diverged in {n} iterations'
+
+
+# Iteration in float64 NumPy arrays. T and C are only built when requested.
+def float_steps(A, b, x0, tol, niter, method, relativeError, w=1,
+                matrices=False, checkConvergence=True):
+    try:
+        with phase("parse"):
+            A = np.asarray(A, dtype=float)
+            b = np.asarray(b, dtype=float).ravel()
+            x0 = np.asarray(x0, dtype=float).ravel()
+        if A.ndim != 2 or A.shape[0] != A.shape[1] or \
+                len(b) != len(A) or len(x0) != len(A):
+            return {"error": "Invalid dimensions"}
+        if w != "auto" and not (0 <= w and w <= 2):
+            return {"error": "W must be between 0 and 2"}
+    except Exception:
+        return {"error": "Error in the input"}
+    err = tol + 1
+    n = 0
+
+    if (np.diag(A) == 0).any():
+        return {"error": "A contains zeros in its diagonal"}
+
+    with phase("setup"):
+        sweeps = DenseSweeps(A, b, w)
+        relaxation = None
+        if w == "auto":
+            relaxation = resolve_w(sweeps, method, x0, tol,
+                                   relativeError)
+            w = sweeps.w
+    convergence = None
+    if checkConvergence:
+        with phase("check"):
+            convergence, error = sweep_check(sweeps, method, x0, tol,
+                                             relativeError)
+        if error:
+            return {"error": error}
+    yield [n, x0.tolist(), 100]
+
+    x = x0.copy()
+    while err > tol and n < niter:
+        charge()
+        if method == "jacobi":
+            x0, x = x, sweeps.jacobi(x)
+        else:
+            x0 = x.copy()
+            sweeps.sor(x)
+        with np.errstate(all="ignore"):
+            err = np.abs(x - x0).max()
+            if not np.isfinite(err):
+                return {"error": diverged(n + 1)}
+            if relativeError:
+                err = err / np.abs(x).max()
+        n += 1
+        yield [n, x.tolist(), float(err)]
+    if n == niter:
+        return {"error": failure(n, convergence)}
+
+    result = {"x": x.tolist(), "convergence": convergence}
+    if relaxation:
+        result["relaxation"] = relaxation
+    if matrices:
+        with phase("setup"):
+            T, C = float_t_and_c(A, b, method, w)
+        result = {"T": T.tolist(), "C": C.tolist(), **result}
+    return result
+
+
+# Iteration as row sweeps over a sparse (CSR) matrix; T and C are never
+# formed, so only x is returned
+def sparse_steps(A, b, x0, tol, niter, method, relativeError, w=1,
+                 checkConvergence=True):
+    try:
+        with phase("parse"):
+            A = from_input(A)
+            b = np.asarray(b, dtype=float).ravel()
+            x0 = np.asarray(x0, dtype=float).ravel()
+        if A.shape[0] != A.shape[1] or \
+                len(b) != A.shape[0] or len(x0) != A.shape[0]:
+            return {"error": "Invalid dimensions"}
+        if w != "auto" and not (0 <= w and w <= 2):
+            return {"error": "W must be between 0 and 2"}
+    except Exception:
+        return {"error": "Error in the input"}
+    err = tol + 1
+    n = 0
+
+    with phase("setup"):
+        sweeps = Sweeps(A, b, w)
+        if (sweeps.d == 0).any():
+            return {"error": "A contains zeros in its diagonal"}
+        if method != "jacobi":
+            sweeps.levels()
+        relaxation = None
+        if w == "auto":
+            relaxation = resolve_w(sweeps, method, x0, tol,
+                                   relativeError)
+    convergence = None
+    if checkConvergence:
+        with phase("check"):
+            convergence, error = sweep_check(sweeps, method, x0, tol,
+                                             relativeError)
+        if error:
+            return {"error": error}
+    yield [n, x0.tolist(), 100]
+
+    x = x0.copy()
+    while err > tol and n < niter:
+        charge()
+        if method == "jacobi":
+            x0, x = x, sweeps.jacobi(x)
+        else:
+            x0 = x.copy()
+            sweeps.sor(x)
+        with np.errstate(all="ignore"):
+            err = np.abs(x - x0).max()
+            if not np.isfinite(err):
+                return {"error": diverged(n + 1)}
+            if relativeError:
+                err = err / np.abs(x).max()
+        n += 1
+        yield [n, x.tolist(), float(err)]
+    if n == niter:
+        return {"error": failure(n, convergence)}
+
+    result = {"x": x.tolist(), "convergence": convergence}
+    if relaxation:
+        result["relaxation"] = relaxation
+    return result
+
+
+# Iteration of a block of right-hand sides B (n x k, one column per system)
+# on a dense or sparse A. Every sweep works on the whole block, so its
+# products are matrix-matrix, and columns drop out of the sweep as soon as
+# they converge. Rows carry the n x k iterate and one error per column.
+def block_steps(A, B, x0, tol, niter, method, relativeError, w=1,
+                matrices=False, checkConvergence=True):
+    try:
+        with phase("parse"):
+            A = from_input(A) if isinstance(A, (dict, CSRMatrix)) else \
+                np.asarray(A, dtype=float)
+            B = np.asarray(B, dtype=float)
+            X = np.asarray(x0, dtype=float)
+            if X.ndim == 1 and B.ndim == 2:
+                # One starting vector for every column
+                X = np.repeat(X[:, None], B.shape[1], axis=1)
+        if len(A.shape) != 2 or A.shape[0] != A.shape[1] or B.ndim != 2 or \
+                len(B) != A.shape[0] or X.shape != B.shape:
+            return {"error": "Invalid dimensions"}
+        if w != "auto" and not (0 <= w and w <= 2):
+            return {"error": "W must be between 0 and 2"}
+    except Exception:
+        return {"error": "Error in the input"}
+    k = B.shape[1]
+    n = 0
+
+    with phase("setup"):
+        if isinstance(A, CSRMatrix):
+            sweeps = Sweeps(A, B, w)
+            if method != "jacobi":
+                sweeps.levels()
+        else:
+            sweeps = DenseSweeps(A, B, w)
+        if (sweeps.d == 0).any():
+            return {"error": "A contains zeros in its diagonal"}
+        relaxation = None
+        if w == "auto":
+            # Chosen on the first column; w does not depend on b
+            column = with_rhs(sweeps, B[:, 0])
+            relaxation = resolve_w(column, method, X[:, 0], tol,
+                                   relativeError)
+            sweeps.w = w = column.w
+    convergence = None
+    if checkConvergence:
+        with phase("check"):
+            convergence, error = sweep_check(sweeps, method, X, tol,
+                                             relativeError)
+        if error:
+            return {"error": error}
+    # Rows carry arrays; listing n x k values per iteration would cost more
+    # than the sweep
+    yield [n, X.copy(), np.full(k, 100.0)]
+
+    errors = np.full(k, 100.0)
+    iterations = np.zeros(k, dtype=int)
+    active = np.arange(k)
+    current = sweeps
+    while active.size and n < niter:
+        charge(active.size)
+        X0 = X[:, active]
+        if method == "jacobi":
+            X1 = current.jacobi(X0)
+        else:
+            X1 = current.sor(X0.copy())
+        with np.errstate(all="ignore"):
+            err = np.abs(X1 - X0).max(axis=0)
+            if not np.isfinite(err).all():
+                return {"error": f'{diverged(n + 1)} for columns '
+                                 f'{active[~np.isfinite(err)].tolist()}'}
+            if relativeError:
+                err = err / np.abs(X1).max(axis=0)
+        X[:, active] = X1
+        errors[active] = err
+        n += 1
+        iterations[active] = n
+        yield [n, X.copy(), errors.copy()]
+        done = err <= tol
+        if done.any():
+            active = active[~done]
+            current = with_rhs(sweeps, B[:, active])
+    if active.size:
+        return {"error": f'{failure(n, convergence)} '
+                         f'for columns {active.tolist()}'}
+
+    result = {"x": X.tolist(), "iterations": iterations.tolist(),
+              "convergence": convergence}
+    if relaxation:
+        result["relaxation"] = relaxation
+    if matrices and not isinstance(A, CSRMatrix):
+        with phase("setup"):
+            T, C = float_t_and_c(A, B, method, w)
+        result = {"T": T.tolist(), "C": C.tolist(), **result}
+    return result
+
+
+def iterative_steps(A, b, x0, tol, niter, method, relativeError, w=1,
+                    exact=False, matrices=False, checkConvergence=True,
+                    B=None):
+    try:
+        A = resolve(A)
+    except KeyError:
+        return {"error": "Unknown matrix id"}
+    if B is not None:
+        if exact:
+            return {"error": "B is only supported with exact: false"}
+        return (yield from block_steps(A, B, x0, tol, niter, method,
+                                       relativeError, w, matrices,
+                                       checkConvergence))
+    if b is None:
+        return {"error": "Either b or B is required"}
+    if isinstance(A, (dict, CSRMatrix)):
+        if exact:
+            A = from_input(A).to_dense().tolist()
+        else:
+            return (yield from sparse_steps(A, b, x0, tol, niter, method,
+                                            relativeError, w,
+                                            checkConvergence))
+    if exact:
+        return (yield from exact_steps(A, b, x0, tol, niter, method,
+                                       relativeError, w, checkConvergence))
+    return (yield from float_steps(A, b, x0, tol, niter, method,
+                                   relativeError, w, matrices,
+                                   checkConvergence))
+
+
+def Iterative_methods(
+        A: list | dict,
+        b: list | None,
+        x0: list,
+        tol: float,
+        niter: int,
+        method: str,
+        relativeError: bool,
+        w: float | str = 1,
+        history: str = "full",
+        historyK: int = 10,
+        exact: bool = False,
+        matrices: bool = False,
+        checkConvergence: bool = True,
+        B: list | None = None) -> (list, dict, str):
+    steps = iterative_steps(A, b, x0, tol, niter, method, relativeError, w,
+                            exact, matrices, checkConvergence, B)
+    history, result = run_steps(steps, History(history, historyK))
+    if "error" in result:
+        return None, result["error"]
+
+    data = dict(result, columns=columns, rows=history.rows())
+    return data, None
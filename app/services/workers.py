@@ -0,0 +1,308 @@
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from decouple import config
+from fastapi import HTTPException, status
+import services.expressions as ExpressionsService
+from services.budget import BudgetExceeded, MAX_EVALUATIONS, TIMEOUT, \
+    run_budgeted
+from services.metrics import measure
+
+# Solver calls run in a pool of worker processes so that CPU-bound SymPy and
+# NumPy work does not hold the GIL of the server process. At most
+# WORKERS + QUEUE_SIZE requests are admitted at once; the rest are turned
+# away with a 503 and a Retry-After header instead of piling up.
+WORKERS = config("SOLVER_WORKERS", default=os.cpu_count() or 1, cast=int)
+QUEUE_SIZE = config("SOLVER_QUEUE_SIZE", default=2*WORKERS, cast=int)
+RETRY_AFTER = config("SOLVER_RETRY_AFTER", default=1, cast=int)
+PROCESSES = config("SOLVER_PROCESSES", default=True, cast=bool)
+# Streamed rows are sent from the worker in batches, at most every
+# STREAM_FLUSH seconds; the server checks on a silent worker every
+# STREAM_POLL seconds
+STREAM_FLUSH = 0.05
+STREAM_POLL = 1.0
+
+
+# Cache statistics of the worker's process, sent back with every result
+def snapshot():
+    return os.getpid(), ExpressionsService.cache_info()
+
+
+# Run fn in the worker, measuring it there (metrics are per thread)
+def _call(fn, args, kwargs):
+    return measure(lambda: fn(*args, **kwargs)), snapshot()
+
+
+def _call_budgeted(method, seconds, evaluations):
+    return run_budgeted(method, seconds, evaluations), snapshot()
+
+
+# Drive the steps generator fn(*args, **kwargs) in the worker, sending its rows and
+# then its result (or an error) through channel. Rows are batched; the
+# batches stop once the server sets cancelled (the client went away).
+def _stream(fn, args, kwargs, channel, cancelled):
+    rows, flushed = [], float("-inf")
+    try:
+        steps = fn(*args, **kwargs)
+        while True:
+            try:
+                rows.append(next(steps))
+            except StopIteration as stop:
+                channel.put(("rows", rows))
+                channel.put(("result", stop.value))
+                break
+            if time.perf_counter() - flushed >= STREAM_FLUSH:
+                if cancelled.is_set():
+                    steps.close()
+                    break
+                channel.put(("rows", rows))
+                rows, flushed = [], time.perf_counter()
+    except Exception:
+        channel.put(("rows", rows))
+        channel.put(("error", None))
+    return snapshot()
+
+
+class WorkerPool:
+    def __init__(self, workers, queueSize, processes=True):
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queueSize)
+        self.processes = processes
+        self.inFlight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._executor = None
+        self._manager = None
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    # Reserve a slot for a request; False when the pool is saturated
+    def acquire(self):
+        with self._lock:
+            if self.inFlight >= self.capacity:
+                self.rejected += 1
+                return False
+            self.inFlight += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.inFlight -= 1
+
+    # Executors are created on first use so importing the module (and the
+    # worker processes themselves) does not spawn anything
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.processes:
+                    self._executor = ProcessPoolExecutor(self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        self.workers, thread_name_prefix="solver")
+            return self._executor
+
+    # A worker died (e.g. out of memory): start a fresh pool
+    def discard(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self._caches.clear()
+        executor.shutdown(wait=False)
+
+    # Keep the latest cache statistics of a worker process
+    def record(self, snapshot):
+        pid, info = snapshot
+        with self._lock:
+            self._caches[pid] = info
+
+    # Queue and event shared with the worker running a stream
+    def channel(self):
+        if not self.processes:
+            return queue.Queue(), threading.Event()
+        with self._lock:
+            if self._manager is None:
+                self._manager = multiprocessing.Manager()
+            return self._manager.Queue(), self._manager.Event()
+
+    # Run fn(*args, **kwargs) in a worker; returns (result, metrics)
+    def run(self, fn, *args, **kwargs):
+        executor = self.executor()
+        try:
+            result, snapshot = executor.submit(_call, fn, args, kwargs).result()
+        except BrokenProcessPool:
+            self.discard(executor)
+            raise
+        self.record(snapshot)
+        return result
+
+    # Run named methods (picklable callables) in the workers, each with its
+    # own budget, which starts when the method does. Every method stops at
+    # its first charge() past the budget, so with at most `workers` of them
+    # running at once they all end within ceil(methods / workers) budgets;
+    # the ones still queued or running by then are reported as timed out.
+    def run_methods(self, methods, seconds=None, evaluations=None):
+        seconds = TIMEOUT if seconds is None else seconds
+        evaluations = MAX_EVALUATIONS if evaluations is None else evaluations
+        executor = self.executor()
+        futures = [executor.submit(_call_budgeted, method, seconds,
+                                   evaluations)
+                   for _, method in methods]
+        wait(futures, timeout=seconds * math.ceil(len(methods) / self.workers))
+
+        outcomes = []
+        for (name, _), future in zip(methods, futures):
+            if not future.done():
+                future.cancel()
+                outcome = {
+                    "result": None,
+                    "exception": BudgetExceeded("Time budget exceeded"),
+                    "time": seconds,
+                    "evaluations": None,
+                    "metrics": None,
+                }
+            else:
+                try:
+                    outcome, snapshot = future.result()
+                    self.record(snapshot)
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        self.discard(executor)
+                    outcome = {
+                        "result": None,
+                        "exception": e,
+                        "time": None,
+                        "evaluations": None,
+                        "metrics": None,
+                    }
+            outcome["method"] = name
+            outcome["timed_out"] = isinstance(outcome["exception"],
+                                              BudgetExceeded)
+            outcomes.append(outcome)
+        return outcomes
+
+    # Run the steps generator fn(*args, **kwargs) in a worker: a generator yielding its
+    # rows as they arrive and returning its result, that raises ValueError
+    # when the steps fail
+    def stream(self, fn, *args, **kwargs):
+        executor = self.executor()
+        channel, cancelled = self.channel()
+        future = executor.submit(_stream, fn, args, kwargs, channel,
+                                 cancelled)
+        try:
+            while True:
+                try:
+                    kind, value = channel.get(timeout=STREAM_POLL)
+                except queue.Empty:
+                    if future.done():
+                        if isinstance(future.exception(), BrokenProcessPool):
+                            self.discard(executor)
+                        raise ValueError("Worker stopped")
+                    continue
+                if kind == "rows":
+                    yield from value
+                elif kind == "result":
+                    self.record(future.result())
+                    return value
+                else:
+                    raise ValueError("Invalid input")
+        finally:
+            cancelled.set()
+
+    # Cache statistics of the worker processes (as of their latest task),
+    # added up; without processes, the server's own
+    def cache_info(self):
+        if not self.processes:
+            return ExpressionsService.cache_info()
+        with self._lock:
+            infos = list(self._caches.values())
+        total = {"processes": len(infos)}
+        for cache in ("functions", "params"):
+            total[cache] = {
+                "size": sum(info[cache]["size"] for info in infos),
+                "maxsize": ExpressionsService.CACHE_SIZE,
+                "hits": sum(info[cache]["hits"] for info in infos),
+                "misses": sum(info[cache]["misses"] for info in infos),
+            }
+        return total
+
+    def stats(self):
+        with self._lock:
+            busy = min(self.inFlight, self.workers)
+            return {
+                "workers": self.workers,
+                "processes": self.processes,
+                "capacity": self.capacity,
+                "inFlight": self.inFlight,
+                "busy": busy,
+                "queued": self.inFlight - busy,
+                "utilisation": busy / self.workers,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+
+pool = WorkerPool(WORKERS, QUEUE_SIZE, PROCESSES)
+
+
+def run(fn, *args, **kwargs):
+    return pool.run(fn, *args, **kwargs)
+
+
+def run_methods(methods, seconds=None, evaluations=None):
+    return pool.run_methods(methods, seconds, evaluations)
+
+
+def run_stream(fn, *args, **kwargs):
+    return pool.stream(fn, *args, **kwargs)
+
+
+def stats():
+    return pool.stats()
+
+
+def cache_info():
+    return pool.cache_info()
+
+
+# Admission slot of a request. FastAPI closes the dependencies before a
+# streaming body is sent, so a streaming response detaches the slot and
+# releases it itself when the body ends.
+class Slot:
+    def __init__(self, pool):
+        self.pool = pool
+        self.held = True
+        self.detached = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            held, self.held = self.held, False
+        if held:
+            self.pool.release()
+
+    # Keep the slot past the request handler; returns its release function
+    def detach(self):
+        self.detached = True
+        return self.release
+
+
+# Router dependency: admit the request or reject it right away
+def admit():
+    if not pool.acquire():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, retry later",
+            headers={"Retry-After": str(RETRY_AFTER)},
+        )
+    slot = Slot(pool)
+    try:
+        yield slot
+    finally:
+        if not slot.detached:
+            slot.release()